@@ -0,0 +1,48 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_TYPES = ("thread", "process")
+
+
+def read_files0_from(name: str) -> list:
+    # NUL-separated file list, '-' means stdin (GNU --files0-from)
+    if name == "-":
+        data = sys.stdin.buffer.read()
+    else:
+        with open(name, 'rb') as file:
+            data = file.read()
+    return [item.decode('utf-8', errors='surrogateescape') for item in data.split(b'\0') if item]
+
+
+def map_in_order(func, items: list, jobs: int = 1, executor_type: str = "thread"):
+    # results are yielded in the order of items whatever order the workers finish in
+    jobs = min(jobs, len(items))
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+    if executor_type == "thread":
+        with ThreadPoolExecutor(max_workers=jobs) as ex:
+            yield from ex.map(func, items)
+    else:
+        # many tiny files: hand each worker batches to amortize the pickling round trips
+        chunksize = max(1, len(items) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            yield from ex.map(func, items, chunksize=chunksize)
+
+
+def add_job_arguments(parser):
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="process up to N files concurrently")
+    parser.add_argument("--executor", choices=EXECUTOR_TYPES, default="thread",
+                        help="worker pool used with --jobs (default: thread)")
+    parser.add_argument("--files0-from", dest="files0_from", metavar="F",
+                        help="read NUL-separated file names from F ('-' for stdin)")
+
+
+def resolve_files(parser, args) -> list:
+    if args.files0_from is None:
+        return args.files
+    if args.files:
+        parser.error(f"extra operand '{args.files[0]}': file operands cannot be combined with --files0-from")
+    return read_files0_from(args.files0_from)
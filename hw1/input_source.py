@@ -0,0 +1,150 @@
+import mmap
+import os
+import stat
+import sys
+from pathlib import Path
+
+CHUNK_SIZE = 1024 * 1024
+
+
+# Read-only input shared by nl.py, tail.py and wc.py: regular files are
+# memory-mapped and handed out as zero-copy memoryview slices, pipes, stdin and
+# files that cannot be mapped are streamed through the buffered file object.
+class InputSource:
+    def __init__(self, file, name: str = "", owns_file: bool = True):
+        self.file = file
+        self.name = name
+        self._owns_file = owns_file
+        self._mmap = None
+        self._view = None
+        self.size = None
+        try:
+            st = os.fstat(file.fileno())
+        except (AttributeError, OSError, ValueError):
+            return
+        if not stat.S_ISREG(st.st_mode):
+            return
+        self.size = st.st_size
+        if st.st_size == 0:
+            # empty (or /proc-like) files cannot be mapped, stream them instead
+            return
+        try:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        self.size = len(self._mmap)
+        self._view = memoryview(self._mmap)
+
+    @classmethod
+    def open(cls, path: Path) -> "InputSource":
+        if not path.is_file():
+            raise FileNotFoundError(f"File not found: {path}")
+        return cls(path.open('rb'), str(path))
+
+    @classmethod
+    def stdin(cls) -> "InputSource":
+        return cls(sys.stdin.buffer, "", owns_file=False)
+
+    @property
+    def mapped(self) -> bool:
+        return self._mmap is not None
+
+    def view(self, start: int = 0, end: int = None) -> memoryview:
+        if not self.mapped:
+            raise ValueError(f"{self.name or 'stdin'} is not memory-mapped")
+        return self._view[start:end]
+
+    def find(self, sub: bytes, start: int = 0, end: int = None) -> int:
+        return self._mmap.find(sub, start, self.size if end is None else end)
+
+    def rfind(self, sub: bytes, start: int = 0, end: int = None) -> int:
+        return self._mmap.rfind(sub, start, self.size if end is None else end)
+
+    def read_range(self, start: int, end: int):
+        if self.mapped:
+            return self._view[start:end]
+        self.file.seek(start)
+        return self.file.read(max(end - start, 0))
+
+    def chunks(self, start: int = 0, end: int = None, chunk_size: int = CHUNK_SIZE):
+        if self.mapped:
+            end = self.size if end is None else min(end, self.size)
+            for pos in range(start, end, chunk_size):
+                yield self._view[pos:min(pos + chunk_size, end)]
+            return
+        if start:
+            self.file.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            n = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = self.file.read(n)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+    def line_offsets(self, start: int = 0):
+        # (start, end) of every line, end excludes the '\n'
+        if not self.mapped:
+            raise ValueError(f"{self.name or 'stdin'} is not memory-mapped")
+        find = self._mmap.find
+        size = self.size
+        pos = start
+        while pos < size:
+            nl = find(b'\n', pos)
+            if nl < 0:
+                yield pos, size
+                return
+            yield pos, nl
+            pos = nl + 1
+
+    def lines(self, start: int = 0):
+        # the '\n' is stripped; mapped files are split one CHUNK_SIZE slice at a
+        # time, which is far cheaper than slicing the mapping once per line
+        if self.mapped:
+            mm = self._mmap
+            size = self.size
+            pos = start
+            while pos < size:
+                end = min(pos + CHUNK_SIZE, size)
+                if end < size:
+                    nl = mm.rfind(b'\n', pos, end)
+                    if nl < 0:
+                        nl = mm.find(b'\n', end)
+                    end = size if nl < 0 else nl + 1
+                block = mm[pos:end]
+                pos = end
+                block_lines = block.split(b'\n')
+                if block.endswith(b'\n'):
+                    block_lines.pop()
+                yield from block_lines
+            return
+        if start:
+            self.file.seek(start)
+        for line in self.file:
+            yield line[:-1] if line.endswith(b'\n') else line
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # a caller still holds a slice; the mapping goes away with it
+                pass
+            self._mmap = None
+        if self._owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def decode(data) -> str:
+    return str(data, 'utf-8', 'replace')
@@ -0,0 +1,176 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from itertools import accumulate, islice
+from pathlib import Path
+
+from input_source import InputSource
+
+INDEX_SUFFIX = ".lidx"
+INDEX_MAGIC = b"HW1LIDX1"
+# magic, indexed size, mtime_ns, entry count, fingerprint of the indexed head and tail
+HEADER = struct.Struct("<8sQqQ16s")
+FINGERPRINT_SPAN = 4096
+
+
+def _len_plus_one(part: bytes) -> int:
+    return len(part) + 1
+
+
+def scan_line_starts(source: InputSource, start: int, end: int) -> array:
+    # offsets just past every '\n' in [start, end)
+    starts = array('Q')
+    for chunk in source.chunks(start, end):
+        block = bytes(chunk)
+        parts = block.split(b'\n')
+        parts.pop()
+        starts.extend(islice(accumulate(map(_len_plus_one, parts), initial=start), 1, None))
+        start += len(block)
+    return starts
+
+
+def scan_line_start(source: InputSource, line_no: int) -> int:
+    # offset of the 0-based line line_no without an index, size if there are fewer lines
+    if line_no <= 0:
+        return 0
+    pos = 0
+    remaining = line_no
+    for chunk in source.chunks():
+        block = bytes(chunk)
+        found = block.count(b'\n')
+        if found < remaining:
+            remaining -= found
+            pos += len(block)
+            continue
+        idx = -1
+        for _ in range(remaining):
+            idx = block.find(b'\n', idx + 1)
+        return pos + idx + 1
+    return pos
+
+
+def _fingerprint(source: InputSource, size: int) -> bytes:
+    # only the first and last FINGERPRINT_SPAN bytes: hashing everything would
+    # make extending the index after an append cost as much as rebuilding it
+    digest = hashlib.blake2b(source.read_range(0, min(FINGERPRINT_SPAN, size)), digest_size=16)
+    digest.update(source.read_range(max(size - FINGERPRINT_SPAN, 0), size))
+    return digest.digest()
+
+
+def _publish(index_path: Path, header: bytes, parts) -> mmap.mmap:
+    # a published index is never changed in place, readers may have it mapped:
+    # the new one is written aside and swapped in, and comes back mapped
+    fd, tmp_path = tempfile.mkstemp(prefix=index_path.name + ".", suffix=".tmp", dir=index_path.parent)
+    try:
+        with os.fdopen(fd, 'w+b') as file:
+            file.write(header)
+            for part in parts:
+                file.write(part)
+            file.flush()
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return mapping
+
+
+# Sidecar index of line start offsets for append-only files. Entry i is the
+# offset of line i; a final entry equal to the file size marks the start of a
+# line that does not exist yet, and becomes real once more data is appended.
+class LineIndex:
+    def __init__(self, entries, size: int):
+        self._entries = entries
+        self.size = size
+
+    @property
+    def line_count(self) -> int:
+        count = len(self._entries)
+        if count and self._entries[count - 1] >= self.size:
+            count -= 1
+        return count
+
+    def line_start(self, line_no: int) -> int:
+        if line_no >= self.line_count:
+            return self.size
+        return self._entries[max(line_no, 0)]
+
+    @staticmethod
+    def path_for(path: Path) -> Path:
+        return path.with_name(path.name + INDEX_SUFFIX)
+
+    @classmethod
+    def build(cls, source: InputSource) -> "LineIndex":
+        entries = array('Q', [0])
+        entries.extend(scan_line_starts(source, 0, source.size))
+        return cls(entries, source.size)
+
+    @classmethod
+    def load(cls, path: Path, source: InputSource, index_path: Path = None) -> "LineIndex":
+        # validate the sidecar against size/mtime/fingerprint, extend it for
+        # appended bytes only, rebuild it when the file was rewritten
+        if index_path is None:
+            index_path = cls.path_for(path)
+        st = os.stat(path)
+        size = source.size
+        try:
+            index = cls._load_existing(index_path, source, size, st.st_mtime_ns)
+        except (OSError, ValueError, struct.error):
+            index = None
+        if index is not None:
+            return index
+        index = cls.build(source)
+        try:
+            index._save(index_path, st.st_mtime_ns, _fingerprint(source, size))
+        except OSError:
+            # read-only location: the in-memory index still serves this run
+            pass
+        return index
+
+    @classmethod
+    def _load_existing(cls, index_path: Path, source: InputSource, size: int, mtime_ns: int):
+        with open(index_path, 'rb') as file:
+            header = file.read(HEADER.size)
+            magic, indexed_size, indexed_mtime, count, fingerprint = HEADER.unpack(header)
+            if magic != INDEX_MAGIC or indexed_size > size:
+                return None
+            if os.fstat(file.fileno()).st_size < HEADER.size + count * 8:
+                return None
+            if indexed_mtime != mtime_ns:
+                # same size but touched: rewritten in place, nothing to extend
+                if indexed_size == size:
+                    return None
+            if indexed_size != size and _fingerprint(source, indexed_size) != fingerprint:
+                return None
+            # entries are looked up in place, opening a huge index costs O(1)
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if indexed_size < size:
+            appended = scan_line_starts(source, indexed_size, size)
+            if sys.byteorder != "little":
+                appended.byteswap()
+            # the old entries are copied, only the appended bytes are scanned
+            old = memoryview(mapping)[HEADER.size:HEADER.size + count * 8]
+            header = HEADER.pack(INDEX_MAGIC, size, mtime_ns, count + len(appended), _fingerprint(source, size))
+            mapping = _publish(index_path, header, (old, appended.tobytes()))
+            count += len(appended)
+        entries = memoryview(mapping)[HEADER.size:HEADER.size + count * 8]
+        if sys.byteorder != "little":
+            swapped = array('Q')
+            swapped.frombytes(entries)
+            swapped.byteswap()
+            return cls(swapped, size)
+        return cls(entries.cast('Q'), size)
+
+    def _save(self, index_path: Path, mtime_ns: int, fingerprint: bytes):
+        entries = array('Q', self._entries)
+        if sys.byteorder != "little":
+            entries.byteswap()
+        header = HEADER.pack(INDEX_MAGIC, self.size, mtime_ns, len(entries), fingerprint)
+        _publish(index_path, header, (entries.tobytes(),)).close()
@@ -1,42 +1,162 @@
+import argparse
+import re
 import sys
+from itertools import islice
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from input_source import InputSource  # noqa: E402
+from line_index import INDEX_SUFFIX, LineIndex, scan_line_start  # noqa: E402
 
-def get_lines_from_file(path: Path):
-    if not path.is_file():
-        raise FileNotFoundError(f"File not found: {path}")
-    with path.open('r', encoding='utf-8', errors='replace') as file:
-        lines = file.read().splitlines()
-    return lines
+NUM_WIDTH = 6
+SEPARATOR = "\t"
+# lines buffered before one write() to stdout
+OUTPUT_BATCH_LINES = 4096
 
 
-def get_lines_from_stdin():
-    data = sys.stdin.read()
-    lines = data.splitlines()
-    return lines
+def iter_source_lines(source: InputSource, start: int = 0, count: int = None):
+    # lines stay undecoded bytes and are written back as they are, one batch at a time
+    with source:
+        yield from islice(source.lines(start), count)
+
+
+def get_lines_from_file(path: Path, line_range: tuple = None, use_index: bool = False):
+    source = InputSource.open(path)
+    if line_range is None:
+        return iter_source_lines(source)
+    first, last = line_range
+    count = None if last is None else max(last - first + 1, 0)
+    if source.size == 0:
+        return iter_source_lines(source, 0, 0)
+    if use_index:
+        start = LineIndex.load(path, source).line_start(first - 1)
+    else:
+        start = scan_line_start(source, first - 1)
+    return iter_source_lines(source, start, count)
+
+
+def get_lines_from_stdin(line_range: tuple = None):
+    if line_range is None:
+        return iter_source_lines(InputSource.stdin())
+    first, last = line_range
+    return islice(iter_source_lines(InputSource.stdin()), first - 1, last)
+
 
+def parse_body_style(value: str):
+    if value in ("a", "t", "n"):
+        return value
+    if value.startswith("p") and len(value) > 1:
+        try:
+            re.compile(value[1:])
+        except re.error as e:
+            raise argparse.ArgumentTypeError(f"invalid regular expression '{value[1:]}': {e}")
+        return value
+    raise argparse.ArgumentTypeError(f"invalid body numbering style: '{value}'")
 
-def get_lines():
-    args = sys.argv[1:]
-    if len(args) > 0:
-        path = Path(args[0])
-        lines = get_lines_from_file(path)
+
+def parse_line_range(value: str):
+    # START:END, 1-based and inclusive, either side may be left empty
+    start, sep, end = value.partition(":")
+    try:
+        first = int(start) if start else 1
+        last = int(end) if end else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid line range: '{value}'")
+    if not sep:
+        last = first
+    if first < 1 or (last is not None and last < first):
+        raise argparse.ArgumentTypeError(f"invalid line range: '{value}'")
+    return first, last
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="nl.py", description="Number lines of a file.")
+    parser.add_argument("-b", "--body-numbering", type=parse_body_style, default="a", metavar="STYLE",
+                        help="a: all lines (default), t: non-empty lines, n: no lines, "
+                             "pREGEX: lines matching REGEX")
+    parser.add_argument("-w", "--number-width", type=int, default=NUM_WIDTH, metavar="N",
+                        help=f"use N columns for line numbers (default {NUM_WIDTH})")
+    parser.add_argument("-s", "--number-separator", default=SEPARATOR, metavar="STRING",
+                        help="add STRING after the line number (default TAB)")
+    parser.add_argument("-v", "--starting-line-number", type=int, default=1, metavar="N",
+                        help="first line number (default 1)")
+    parser.add_argument("-i", "--line-increment", type=int, default=1, metavar="N",
+                        help="line number increment (default 1)")
+    parser.add_argument("--range", type=parse_line_range, dest="line_range", metavar="START:END",
+                        help="only output lines START to END (1-based, inclusive)")
+    parser.add_argument("--index", action="store_true",
+                        help=f"seek with a sidecar line index (FILE{INDEX_SUFFIX}), "
+                             "created or extended as needed")
+    parser.add_argument("file", nargs="?")
+    args = parser.parse_args(argv)
+    if args.number_width < 1:
+        parser.error(f"invalid line number field width: '{args.number_width}'")
+    if args.line_range is not None and args.body_numbering not in ("a", "n"):
+        # numbers of a range under -bt/-bp depend on every line before it
+        parser.error("--range can only be combined with -b a or -b n")
+    return args
+
+
+def get_lines(args=None):
+    if args is None:
+        args = parse_args()
+    if args.file is not None:
+        path = Path(args.file)
+        lines = get_lines_from_file(path, args.line_range, args.index)
     else:
-        lines = get_lines_from_stdin()
+        lines = get_lines_from_stdin(args.line_range)
     return lines
 
 
-def print_enum_lines(lines: list[str]):
-    NUM_WIDTH = 6
-    for i, line in enumerate(lines, start=1):
-        num_field = str(i).rjust(NUM_WIDTH)
-        print(f"{num_field}\t{line}")
+def get_line_selector(body_style: str):
+    if body_style == "a":
+        return None
+    if body_style == "t":
+        return len
+    if body_style == "n":
+        return lambda line: False
+    return re.compile(body_style[1:].encode()).search
+
+
+def print_enum_lines(lines, body_style: str = "a", width: int = NUM_WIDTH, separator: str = SEPARATOR,
+                     start: int = 1, increment: int = 1, out=None):
+    if out is None:
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+    sep = separator.encode()
+    number_fmt = b"%" + str(width).encode() + b"d" + sep.replace(b"%", b"%%")
+    no_number = b" " * (width + len(sep))
+    selector = get_line_selector(body_style)
+    number = start
+    parts = []
+    append = parts.append
+    batch_parts = 3 * OUTPUT_BATCH_LINES
+    for line in lines:
+        if selector is None or selector(line):
+            append(number_fmt % number)
+            number += increment
+        else:
+            append(no_number)
+        append(line)
+        append(b"\n")
+        if len(parts) >= batch_parts:
+            out.write(b"".join(parts))
+            parts.clear()
+    if parts:
+        out.write(b"".join(parts))
+        parts.clear()
+    out.flush()
 
 
 def main():
     try:
-        lines = get_lines()
-        print_enum_lines(lines)
+        args = parse_args()
+        lines = get_lines(args)
+        start = args.starting_line_number
+        if args.line_range is not None:
+            start += (args.line_range[0] - 1) * args.line_increment
+        print_enum_lines(lines, args.body_numbering, args.number_width, args.number_separator,
+                         start, args.line_increment)
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -45,4 +165,4 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
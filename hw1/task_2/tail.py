@@ -1,47 +1,436 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
 import sys
+import time
+from collections import deque
+from functools import partial
+from itertools import islice
 from pathlib import Path
+from typing import NamedTuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from file_jobs import add_job_arguments, map_in_order, resolve_files  # noqa: E402
+from input_source import InputSource, decode  # noqa: E402
+from line_index import INDEX_SUFFIX, LineIndex, scan_line_start  # noqa: E402
 
-def get_last_10_lines_from_file(path: Path):
-    if not path.is_file():
-        raise FileNotFoundError(f"File not found: {path}")
-    with path.open('r', encoding='utf-8', errors='replace') as file:
-        last_10_lines = file.read().splitlines()[-10:]
-    return last_10_lines
+BLOCK_SIZE = 64 * 1024
+FILE_DEFAULT_LINES = 10
+STDIN_DEFAULT_LINES = 17
+MIN_POLL_INTERVAL = 0.05
+DEFAULT_SLEEP_INTERVAL = 1.0
 
 
-def get_last_17_lines_from_stdin():
-    data = sys.stdin.read()
-    last_17_lines = data.splitlines()[-17:]
-    return last_17_lines
+def find_last_lines_offset_in_file(file, size: int, n_lines: int) -> int:
+    # walk backwards block by block until n_lines newlines are found
+    if n_lines <= 0 or size == 0:
+        return size
+    file.seek(size - 1)
+    end = size - 1 if file.read(1) == b'\n' else size
+    newlines = 0
+    pos = end
+    while pos > 0:
+        read_size = min(BLOCK_SIZE, pos)
+        pos -= read_size
+        file.seek(pos)
+        block = file.read(read_size)
+        idx = len(block)
+        while True:
+            idx = block.rfind(b'\n', 0, idx)
+            if idx < 0:
+                break
+            newlines += 1
+            if newlines == n_lines:
+                return pos + idx + 1
+    return 0
 
 
-def get_name_with_last_N_lines():
+def find_last_lines_offset(source: InputSource, size: int, n_lines: int) -> int:
+    if not source.mapped:
+        return find_last_lines_offset_in_file(source.file, size, n_lines)
+    if n_lines <= 0 or size == 0:
+        return size
+    # the mapping is searched in place, nothing before the tail is ever copied
+    pos = size - 1 if source.rfind(b'\n', size - 1, size) >= 0 else size
+    for _ in range(n_lines):
+        pos = source.rfind(b'\n', 0, pos)
+        if pos < 0:
+            return 0
+    return pos + 1
+
+
+class FileRange(NamedTuple):
+    # -n +K output, streamed from the file by print_last_lines instead of held in memory
+    path: str
+    start: int
+    end: int
+
+
+class StdinFrom(NamedTuple):
+    # -n +K on stdin: the lines are streamed by print_last_lines as they are read
+    from_line: int
+
+
+def decode_lines(data) -> list:
+    return decode(data).splitlines()
+
+
+def get_last_lines(source: InputSource, n_lines: int, end: int = None):
+    size = source.size if end is None else min(end, source.size)
+    offset = find_last_lines_offset(source, size, n_lines)
+    return decode_lines(source.read_range(offset, size))
+
+
+def get_last_bytes(source: InputSource, n_bytes: int, end: int = None):
+    size = source.size if end is None else min(end, source.size)
+    offset = max(size - max(n_bytes, 0), 0)
+    return bytes(source.read_range(offset, size))
+
+
+def get_last_lines_from_file(path: Path, n_lines: int = FILE_DEFAULT_LINES, end: int = None):
+    with InputSource.open(path) as source:
+        return get_last_lines(source, n_lines, end)
+
+
+def get_last_bytes_from_file(path: Path, n_bytes: int, end: int = None):
+    with InputSource.open(path) as source:
+        return get_last_bytes(source, n_bytes, end)
+
+
+def get_lines_from_line_of_file(path: Path, from_line: int, end: int = None, use_index: bool = False):
+    with InputSource.open(path) as source:
+        size = source.size if end is None else min(end, source.size)
+        if use_index and source.size > 0:
+            start = LineIndex.load(path, source).line_start(from_line - 1)
+        else:
+            start = scan_line_start(source, from_line - 1)
+    return FileRange(str(path), min(start, size), size)
+
+
+def get_lines_from_line_of_stdin(from_line: int):
+    return StdinFrom(from_line)
+
+
+def get_last_lines_from_stdin(n_lines: int = STDIN_DEFAULT_LINES):
+    with InputSource.stdin() as source:
+        if source.size is not None:
+            # stdin redirected from a regular file can be searched from the end
+            return get_last_lines(source, n_lines)
+        last_lines = deque(source.lines(), maxlen=max(n_lines, 0))
+    return [decode(line) for line in last_lines]
+
+
+def get_last_bytes_from_stdin(n_bytes: int):
+    with InputSource.stdin() as source:
+        if source.size is not None:
+            return get_last_bytes(source, n_bytes)
+        buf = bytearray()
+        if n_bytes <= 0:
+            return bytes(buf)
+        for block in source.chunks(chunk_size=BLOCK_SIZE):
+            buf += block
+            if len(buf) > n_bytes:
+                del buf[:-n_bytes]
+    return bytes(buf)
+
+
+class FollowedFile:
+    def __init__(self, name: str, by_name: bool):
+        self.name = name
+        self.by_name = by_name
+        self.file = None
+        self.ident = None
+        self.pos = 0
+        self.missing = False
+
+    def open(self, at_end: bool) -> bool:
+        try:
+            file = open(self.name, 'rb')
+        except OSError:
+            return False
+        st = os.fstat(file.fileno())
+        self.file = file
+        self.ident = (st.st_dev, st.st_ino)
+        self.pos = st.st_size if at_end else 0
+        file.seek(self.pos)
+        return True
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.ident = None
+
+    def _drain(self):
+        st = os.fstat(self.file.fileno())
+        if st.st_size < self.pos:
+            print(f"tail: {self.name}: file truncated", file=sys.stderr)
+            self.pos = 0
+            self.file.seek(0)
+        while self.pos < st.st_size:
+            block = self.file.read(min(BLOCK_SIZE, st.st_size - self.pos))
+            if not block:
+                break
+            self.pos += len(block)
+            yield block
+
+    def read_new(self):
+        if self.file is None:
+            if self.by_name and self.open(at_end=False):
+                print(f"tail: '{self.name}' has appeared;  following new file", file=sys.stderr)
+            else:
+                return
+        yield from self._drain()
+        if not self.by_name:
+            return
+        try:
+            st = os.stat(self.name)
+        except OSError:
+            # keep reading the old descriptor until something takes the name again
+            if not self.missing:
+                print(f"tail: '{self.name}' has become inaccessible", file=sys.stderr)
+                self.missing = True
+            return
+        self.missing = False
+        if (st.st_dev, st.st_ino) != self.ident:
+            # rotated: whatever was left in the old file has been drained above
+            self.close()
+            if self.open(at_end=False):
+                print(f"tail: '{self.name}' has been replaced;  following new file", file=sys.stderr)
+                yield from self._drain()
+
+
+class PollingWatcher:
+    def __init__(self, max_interval: float):
+        self.max_interval = max_interval
+        self.interval = min(MIN_POLL_INTERVAL, max_interval)
+
+    def wait(self, active: bool):
+        # back off exponentially while idle, snap back on activity
+        if active:
+            self.interval = min(MIN_POLL_INTERVAL, self.max_interval)
+            return
+        time.sleep(self.interval)
+        self.interval = min(self.interval * 2, self.max_interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, names: list, timeout: float):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.fd = fd
+        self.timeout = timeout
+        # watching parent directories also reports creation and renames of the files
+        for directory in {os.path.dirname(os.path.abspath(name)) for name in names}:
+            if libc.inotify_add_watch(fd, os.fsencode(directory), self.WATCH_MASK) < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, active: bool):
+        if active:
+            return
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        if ready:
+            try:
+                while os.read(self.fd, BLOCK_SIZE):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(names: list, sleep_interval: float, use_inotify: bool = True):
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(names, sleep_interval)
+        except (OSError, AttributeError, TypeError):
+            pass
+    return PollingWatcher(sleep_interval)
+
+
+def open_followed_files(names: list, by_name: bool):
+    followed = {}
+    for name in names:
+        follower = FollowedFile(name, by_name)
+        if not follower.open(at_end=True) and not by_name:
+            raise FileNotFoundError(f"File not found: {name}")
+        followed[str(Path(name))] = follower
+    return followed
+
+
+def follow_files(followed: dict, watcher, last_printed: str = None):
+    out = sys.stdout.buffer
+    try:
+        while True:
+            active = False
+            for name, follower in followed.items():
+                for block in follower.read_new():
+                    if name != last_printed:
+                        out.write(f"==> {name} <==\n".encode())
+                        last_printed = name
+                    out.write(block)
+                    active = True
+            if active:
+                out.flush()
+            watcher.wait(active)
+    finally:
+        watcher.close()
+        for follower in followed.values():
+            follower.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="tail.py", description="Output the last part of files.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("-n", "--lines", dest="lines", metavar="[+]N",
+                       help=f"output the last N lines (default {FILE_DEFAULT_LINES} for files, "
+                            f"{STDIN_DEFAULT_LINES} for stdin), or +N to output starting with line N")
+    group.add_argument("-c", "--bytes", type=int, dest="bytes", metavar="N",
+                       help="output the last N bytes")
+    parser.add_argument("-f", "--follow", action="store_true",
+                        help="output appended data as the files grow")
+    parser.add_argument("-F", dest="follow_name", action="store_true",
+                        help="follow by name and retry: survive truncation, rotation and recreation")
+    parser.add_argument("-s", "--sleep-interval", type=float, default=DEFAULT_SLEEP_INTERVAL, metavar="S",
+                        help="maximum seconds between checks while files are idle")
+    parser.add_argument("--poll", action="store_true",
+                        help="use polling even when inotify is available")
+    parser.add_argument("--index", action="store_true",
+                        help=f"seek to -n +N with a sidecar line index (FILE{INDEX_SUFFIX}), "
+                             "created or extended as needed")
+    add_job_arguments(parser)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args(argv)
+    args.files = resolve_files(parser, args)
+    args.from_line = None
+    if args.lines is not None:
+        try:
+            if args.lines.startswith("+"):
+                args.from_line = max(int(args.lines[1:]), 1)
+                args.lines = None
+            else:
+                args.lines = abs(int(args.lines))
+        except ValueError:
+            parser.error(f"invalid number of lines: '{args.lines}'")
+    return args
+
+
+def get_tail_of_file(file_with_end: tuple, n_lines: int = None, n_bytes: int = None,
+                     from_line: int = None, use_index: bool = False):
+    file, end = file_with_end
+    path = Path(file)
+    if n_bytes is not None:
+        return get_last_bytes_from_file(path, n_bytes, end)
+    if from_line is not None:
+        return get_lines_from_line_of_file(path, from_line, end, use_index)
+    n_lines = FILE_DEFAULT_LINES if n_lines is None else n_lines
+    return get_last_lines_from_file(path, n_lines, end)
+
+
+def get_name_with_last_N_lines(args=None, ends: dict = None):
+    if args is None:
+        args = parse_args()
     files_with_last_lines = {}
-    args = sys.argv[1:]
-    if len(args) > 0:
-        for file in args:
-            path = Path(file)
-            last_lines = get_last_10_lines_from_file(path)
-            files_with_last_lines[str(path)] = last_lines
+    if len(args.files) > 0 or args.files0_from is not None:
+        files_with_ends = []
+        for file in args.files:
+            end = None
+            if ends is not None:
+                end = ends[str(Path(file))]
+                if end is None:
+                    print(f"tail: cannot open '{file}' for reading", file=sys.stderr)
+                    continue
+            files_with_ends.append((file, end))
+        get_tail = partial(get_tail_of_file, n_lines=args.lines, n_bytes=args.bytes,
+                           from_line=args.from_line, use_index=args.index)
+        results = map_in_order(get_tail, files_with_ends, args.jobs, args.executor)
+        for (file, _), last_lines in zip(files_with_ends, results):
+            files_with_last_lines[str(Path(file))] = last_lines
     else:
-        last_lines = get_last_17_lines_from_stdin()
+        if args.bytes is not None:
+            last_lines = get_last_bytes_from_stdin(args.bytes)
+        elif args.from_line is not None:
+            last_lines = get_lines_from_line_of_stdin(args.from_line)
+        else:
+            n_lines = STDIN_DEFAULT_LINES if args.lines is None else args.lines
+            last_lines = get_last_lines_from_stdin(n_lines)
         files_with_last_lines[""] = last_lines
     return files_with_last_lines
 
 
 def print_last_lines(files_with_last_lines: dict):
+    unterminated = False
     for key, value in files_with_last_lines.items():
         if key != "":
+            # keep headers on their own line after raw output without a final '\n'
+            if unterminated:
+                print()
             print(f"==> {key} <==")
+        unterminated = False
+        if isinstance(value, bytes):
+            # -c output is passed through untouched
+            sys.stdout.flush()
+            sys.stdout.buffer.write(value)
+            sys.stdout.buffer.flush()
+            unterminated = not value.endswith(b'\n')
+            continue
+        if isinstance(value, FileRange):
+            sys.stdout.flush()
+            with InputSource.open(Path(value.path)) as source:
+                for chunk in source.chunks(value.start, value.end):
+                    sys.stdout.buffer.write(chunk)
+                    unterminated = chunk[-1:] != b'\n'
+            sys.stdout.buffer.flush()
+            continue
+        if isinstance(value, StdinFrom):
+            sys.stdout.flush()
+            with InputSource.stdin() as source:
+                for line in islice(source.lines(), value.from_line - 1, None):
+                    sys.stdout.buffer.write(line)
+                    sys.stdout.buffer.write(b'\n')
+            sys.stdout.buffer.flush()
+            continue
         for line in value:
             print(line)
+    sys.stdout.flush()
 
 
 def main():
     try:
-        files_with_last_lines = get_name_with_last_N_lines()
+        args = parse_args()
+        following = (args.follow or args.follow_name) and len(args.files) > 0
+        if not following:
+            files_with_last_lines = get_name_with_last_N_lines(args)
+            print_last_lines(files_with_last_lines)
+            return
+        # open first so the initial tail and the followed stream meet at the same offset
+        followed = open_followed_files(args.files, by_name=args.follow_name)
+        ends = {name: (f.pos if f.file is not None else None) for name, f in followed.items()}
+        files_with_last_lines = get_name_with_last_N_lines(args, ends)
         print_last_lines(files_with_last_lines)
+        watcher = make_watcher(args.files, args.sleep_interval, use_inotify=not args.poll)
+        last_printed = next(reversed(files_with_last_lines), None)
+        follow_files(followed, watcher, last_printed)
+    except KeyboardInterrupt:
+        pass
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -50,4 +439,4 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
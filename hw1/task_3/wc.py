@@ -1,39 +1,123 @@
+import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from file_jobs import add_job_arguments, map_in_order, resolve_files  # noqa: E402
+from input_source import CHUNK_SIZE, InputSource  # noqa: E402
 
-def get_counters_from_str(data: str):
-    lines_count = data.count('\n')
-    words_count = len(data.split())
-    chars_count = len(data.encode('utf-8'))
-    return lines_count, words_count, chars_count
+PARALLEL_MIN_SIZE = 64 * 1024 * 1024
+WHITESPACE = frozenset(b" \t\n\r\x0b\x0c")
 
 
-def get_counters_from_file(path: Path):
+def get_partial_counters_from_chunks(chunks):
+    # (lines, words, bytes, starts inside a word, ends inside a word)
+    lc, wc, cc = 0, 0, 0
+    starts_in_word = None
+    in_word = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        # count()/split() need a real bytes object; the copy is bounded to one chunk
+        chunk = bytes(chunk)
+        lc += chunk.count(b'\n')
+        wc += len(chunk.split())
+        cc += len(chunk)
+        first_in_word = chunk[0] not in WHITESPACE
+        if starts_in_word is None:
+            starts_in_word = first_in_word
+        if in_word and first_in_word:
+            # the word crossing the chunk boundary was counted twice
+            wc -= 1
+        in_word = chunk[-1] not in WHITESPACE
+    return lc, wc, cc, bool(starts_in_word), in_word
+
+
+def merge_partial_counters(partials: list):
+    lc, wc, cc = 0, 0, 0
+    in_word = False
+    for p_lc, p_wc, p_cc, p_starts_in_word, p_ends_in_word in partials:
+        if p_cc == 0:
+            continue
+        lc += p_lc
+        wc += p_wc
+        cc += p_cc
+        if in_word and p_starts_in_word:
+            wc -= 1
+        in_word = p_ends_in_word
+    return lc, wc, cc
+
+
+def get_partial_counters_from_range(path: str, start: int, size: int = None):
+    with InputSource.open(Path(path)) as source:
+        end = None if size is None else start + size
+        return get_partial_counters_from_chunks(source.chunks(start, end, CHUNK_SIZE))
+
+
+def split_ranges(size: int, parts: int):
+    q, r = divmod(size, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        cnt = q + (1 if i < r else 0)
+        ranges.append((start, cnt))
+        start += cnt
+    return ranges
+
+
+def get_counters_from_file(path: Path, n_workers: int = None):
     if not path.is_file():
         raise FileNotFoundError(f"File not found: {path}")
-    with path.open('r', encoding='utf-8', errors='replace') as file:
-        data = file.read()
-        lc, wc, cc = get_counters_from_str(data)
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    size = path.stat().st_size
+    if n_workers > 1 and size >= PARALLEL_MIN_SIZE:
+        parts = max(1, min(n_workers, size // CHUNK_SIZE))
+        ranges = split_ranges(size, parts)
+        with ProcessPoolExecutor(max_workers=parts) as ex:
+            futures = [ex.submit(get_partial_counters_from_range, str(path), start, cnt)
+                       for start, cnt in ranges]
+            partials = [fut.result() for fut in futures]
+        # anything appended after stat() is picked up by one more sequential pass
+        partials.append(get_partial_counters_from_range(str(path), size))
+    else:
+        partials = [get_partial_counters_from_range(str(path), 0)]
+    lc, wc, cc = merge_partial_counters(partials)
     return lc, wc, cc, str(path)
 
 
 def get_counters_from_stdin():
-    data = sys.stdin.read()
-    lc, wc, cc = get_counters_from_str(data)
+    with InputSource.stdin() as source:
+        partial = get_partial_counters_from_chunks(source.chunks(chunk_size=CHUNK_SIZE))
+    lc, wc, cc = merge_partial_counters([partial])
     return lc, wc, cc, ""
 
 
-def collect_counters():
-    counters = []
-    args = sys.argv[1:]
-    if len(args) > 0:
-        for file in args:
-            path = Path(file)
-            counters.append(get_counters_from_file(path))
-    else:
-        counters.append(get_counters_from_stdin())
-    return counters
+def get_counters_from_name(file: str, n_workers: int = None):
+    return get_counters_from_file(Path(file), n_workers)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="wc.py", description="Print line, word and byte counts.")
+    add_job_arguments(parser)
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args(argv)
+    args.files = resolve_files(parser, args)
+    return args
+
+
+def collect_counters(args=None):
+    if args is None:
+        args = parse_args()
+    if len(args.files) == 0 and args.files0_from is None:
+        return [get_counters_from_stdin()]
+    # process workers must not fork a second pool for big files of their own
+    n_workers = 1 if args.jobs > 1 and args.executor == "process" else None
+    count = partial(get_counters_from_name, n_workers=n_workers)
+    return list(map_in_order(count, args.files, args.jobs, args.executor))
 
 
 def print_counters(counters: list):
@@ -61,4 +145,4 @@ def main():
         sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
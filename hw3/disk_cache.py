@@ -0,0 +1,141 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Hashable, Iterator, Optional, Tuple
+import os
+import tempfile
+import time
+import numpy as np
+import matrix_io
+from matmul_cache import CacheStats
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: single-process use only
+    fcntl = None
+
+LOCK_NAME = ".lock"
+TMP_SUFFIX = ".tmp"
+# temporaries this old were left behind by a writer that died
+STALE_TMP_SECONDS = 3600
+# results at least this large are mapped on a hit instead of read into RAM
+DEFAULT_MAP_MIN_BYTES = 64 * 1024 * 1024
+
+
+# Content-addressed store of matmul results shared by every process that
+# points at the same directory. Keys are operand digests (BLAKE2-256), so a
+# blob name identifies the product; blobs are matrix_io binary files that
+# appear atomically via rename, which keeps readers lock-free.
+class DiskCache:
+    def __init__(self, directory, max_bytes: Optional[int] = 4 * 1024 * 1024 * 1024,
+                 map_min_bytes: int = DEFAULT_MAP_MIN_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.map_min_bytes = map_min_bytes
+        self.stats = CacheStats()
+
+    def path_for(self, key: Tuple[bytes, bytes]) -> Path:
+        return self.directory / ("-".join(part.hex() for part in key) + matrix_io.BINARY_SUFFIX)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / LOCK_NAME, "a+b") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def get(self, key: Tuple[bytes, bytes]) -> Optional[np.ndarray]:
+        path = self.path_for(key)
+        try:
+            size = path.stat().st_size
+            arr = matrix_io.load(path, mmap=size >= self.map_min_bytes)
+        except (OSError, ValueError):
+            # missing, or evicted by another process meanwhile
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        try:
+            # mtime is the recency eviction goes by
+            os.utime(path)
+        except OSError:
+            pass
+        return arr
+
+    def put(self, key: Tuple[bytes, bytes], arr: np.ndarray) -> None:
+        if arr.dtype.kind not in "biufc":
+            return
+        # a blob over the whole budget would evict everything else and stay
+        if self.max_bytes is not None and matrix_io.DATA_OFFSET + arr.nbytes > self.max_bytes:
+            return
+        path = self.path_for(key)
+        fd, tmp = tempfile.mkstemp(prefix=path.stem[:16], suffix=TMP_SUFFIX, dir=self.directory)
+        os.close(fd)
+        try:
+            matrix_io.save(tmp, arr)
+            with self._locked():
+                os.replace(tmp, path)
+                self._evict(keep=path)
+        except OSError:
+            # a full or read-only cache only loses the speedup
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def _evict(self, keep: Path) -> None:
+        if self.max_bytes is None:
+            return
+        now = time.time()
+        blobs, total = [], 0
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith(TMP_SUFFIX):
+                if now - st.st_mtime > STALE_TMP_SECONDS:
+                    self._unlink(entry.path)
+                continue
+            if not entry.name.endswith(matrix_io.BINARY_SUFFIX):
+                continue
+            blobs.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        # least recently used first; readers that already mapped a blob keep it
+        for _, size, blob in sorted(blobs):
+            if total <= self.max_bytes:
+                break
+            if blob == str(keep):
+                continue
+            if self._unlink(blob):
+                total -= size
+                self.stats.evictions += 1
+
+    @staticmethod
+    def _unlink(path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+    def discard(self, key: Tuple[bytes, bytes]) -> None:
+        self._unlink(str(self.path_for(key)))
+
+    def clear(self) -> None:
+        with self._locked():
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(matrix_io.BINARY_SUFFIX):
+                    self._unlink(entry.path)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.path_for(key).exists()
+
+    def total_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory)
+                   if entry.name.endswith(matrix_io.BINARY_SUFFIX))
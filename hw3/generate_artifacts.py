@@ -67,4 +67,7 @@ print("Task 3 artifacts:",
       os.path.join(OUT_DIR, "CD.txt"),
       os.path.join(OUT_DIR, "hash.txt"))
 
-print("hash(A) =", hash(A3), "hash(C) =", hash(C3), "A == C?", np.array_equal(A3._data, C3._data))
\ No newline at end of file
+print("hash(A) =", hash(A3), "hash(C) =", hash(C3), "A == C?", np.array_equal(A3._data, C3._data))
+# the matmul cache is keyed on content digests, so colliding hashes no longer share results
+print("A @ B == AB?", np.array_equal((A3 @ B3)._data, AB_true),
+      "C @ D == CD?", np.array_equal((C3 @ D3)._data, CD_true))
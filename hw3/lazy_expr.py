@@ -0,0 +1,286 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import threading
+import numpy as np
+
+_state = threading.local()
+
+
+def lazy_enabled() -> bool:
+    return getattr(_state, "enabled", False)
+
+
+@contextmanager
+def lazy_mode(enabled: bool = True):
+    # inside the block Matrix/MatrixND operators return Expr nodes instead of results
+    previous = lazy_enabled()
+    _state.enabled = enabled
+    try:
+        yield
+    finally:
+        _state.enabled = previous
+
+
+class Kernels(NamedTuple):
+    # store-level operations for operands that are not ndarrays (sparse
+    # stores); each takes two stores and returns a fresh one
+    add: Callable
+    multiply: Callable
+    matmul: Callable
+
+
+def as_expr(value: Any):
+    if isinstance(value, Expr):
+        return value
+    lazy = getattr(value, "lazy", None)
+    if lazy is None:
+        return NotImplemented
+    return lazy()
+
+
+class Expr:
+    # Node of a lazily evaluated matrix expression. Structurally equal nodes
+    # share a key, which is what common-subexpression elimination runs on.
+    __array_ufunc__ = None
+
+    key: Tuple
+    shape: Tuple[int, int]
+    dtype: np.dtype
+    children: Tuple["Expr", ...] = ()
+
+    def __init__(self):
+        self._value = None
+
+    def __add__(self, other):
+        other = as_expr(other)
+        if other is NotImplemented:
+            return NotImplemented
+        if self.shape != other.shape:
+            raise ValueError(f"Addition: shapes must match, got {self.shape} and {other.shape}")
+        return Elementwise("add", self, other)
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __mul__(self, other):
+        other = as_expr(other)
+        if other is NotImplemented:
+            return NotImplemented
+        if self.shape != other.shape:
+            raise ValueError(f"Elementwise multiply: shapes must match, got {self.shape} and {other.shape}")
+        return Elementwise("mul", self, other)
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __matmul__(self, other):
+        other = as_expr(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return MatMulChain(self, other)
+
+    def __rmatmul__(self, other):
+        other = as_expr(other)
+        if other is NotImplemented:
+            return NotImplemented
+        return MatMulChain(other, self)
+
+    def lazy(self) -> "Expr":
+        return self
+
+    def compute(self):
+        if self._value is None:
+            evaluator = Evaluator(self)
+            arr, owned = evaluator.evaluate(self)
+            self._value = self.result_type(arr, owned)
+        return self._value
+
+    def result_type(self, arr, owned: bool):
+        # stores other than ndarrays are read-only and shared as they are
+        if not owned and isinstance(arr, np.ndarray):
+            arr = arr.copy()
+        return self.leaves()[0].wrap(arr)
+
+    def leaves(self) -> List["Leaf"]:
+        out, stack, seen = [], [self], set()
+        while stack:
+            node = stack.pop()
+            if node.key in seen:
+                continue
+            seen.add(node.key)
+            if isinstance(node, Leaf):
+                out.append(node)
+            stack.extend(reversed(node.children))
+        return out
+
+    def __str__(self) -> str:
+        return str(self.compute())
+
+    def to_file(self, path: str) -> None:
+        self.compute().to_file(path)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} shape={self.shape} dtype={self.dtype}>"
+
+
+class Leaf(Expr):
+    # data is an ndarray or, with kernels to operate on it, any other store
+    def __init__(self, data: Any, wrap: Callable[[Any], Any], source: Any = None,
+                 kernels: Optional[Kernels] = None):
+        super().__init__()
+        self.data = data
+        self.wrap = wrap
+        self.source = source
+        self.kernels = kernels
+        self.shape = data.shape
+        self.dtype = data.dtype
+        # the leaf keeps the array alive, so its id() cannot be reused meanwhile
+        self.key = ("leaf", id(data))
+
+    def compute(self):
+        if self.source is not None:
+            return self.source
+        return super().compute()
+
+
+class Elementwise(Expr):
+    UFUNCS = {"add": np.add, "mul": np.multiply}
+    KERNELS = {"add": "add", "mul": "multiply"}
+
+    def __init__(self, op: str, *operands: Expr):
+        super().__init__()
+        children = []
+        for operand in operands:
+            # flatten a + (b + c) into one n-ary node, evaluated in a single buffer
+            if isinstance(operand, Elementwise) and operand.op == op:
+                children.extend(operand.children)
+            else:
+                children.append(operand)
+        self.op = op
+        self.children = tuple(children)
+        self.shape = children[0].shape
+        self.dtype = np.result_type(*(c.dtype for c in children))
+        # + and * commute, so operand order does not matter for sharing
+        self.key = (op, tuple(sorted((c.key for c in children), key=hash)))
+
+
+class MatMulChain(Expr):
+    def __init__(self, *operands: Expr):
+        super().__init__()
+        children = []
+        for operand in operands:
+            if isinstance(operand, MatMulChain):
+                children.extend(operand.children)
+            else:
+                children.append(operand)
+        for left, right in zip(children, children[1:]):
+            if left.shape[1] != right.shape[0]:
+                raise ValueError(f"Matmul: inner dimensions must be equal, got {left.shape} and {right.shape}")
+        self.children = tuple(children)
+        self.shape = (children[0].shape[0], children[-1].shape[1])
+        self.dtype = np.result_type(*(c.dtype for c in children))
+        self.key = ("matmul", tuple(c.key for c in children))
+
+
+def matmul_chain_order(dims: List[int]) -> List[List[int]]:
+    # classic matrix-chain DP: split[i][j] is where the product of i..j is cut
+    n = len(dims) - 1
+    cost = [[0] * n for _ in range(n)]
+    split = [[0] * n for _ in range(n)]
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length - 1
+            best, best_k = None, i
+            for k in range(i, j):
+                c = cost[i][k] + cost[k + 1][j] + dims[i] * dims[k + 1] * dims[j + 1]
+                if best is None or c < best:
+                    best, best_k = c, k
+            cost[i][j] = best
+            split[i][j] = best_k
+    return split
+
+
+class Evaluator:
+    def __init__(self, root: Expr):
+        self.memo: Dict[Tuple, np.ndarray] = {}
+        self.uses: Dict[Tuple, int] = {}
+        self._count_uses(root)
+        self.kernels = next((leaf.kernels for leaf in root.leaves() if leaf.kernels is not None), None)
+
+    def _count_uses(self, root: Expr) -> None:
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            self.uses[node.key] = self.uses.get(node.key, 0) + 1
+            if self.uses[node.key] == 1:
+                stack.extend(node.children)
+
+    def evaluate(self, node: Expr) -> Tuple[np.ndarray, bool]:
+        # returns the value and whether this evaluation may write into it
+        if isinstance(node, Leaf):
+            return node.data, False
+        arr = self.memo.get(node.key)
+        if arr is not None:
+            return arr, False
+        if isinstance(node, Elementwise):
+            arr, owned = self._elementwise(node), True
+        else:
+            arr, owned = self._matmul_chain(node)
+        if self.uses.get(node.key, 0) > 1:
+            self.memo[node.key] = arr
+            return arr, False
+        return arr, owned
+
+    def _elementwise(self, node: Elementwise) -> np.ndarray:
+        ufunc = Elementwise.UFUNCS[node.op]
+        values = [self.evaluate(child) for child in node.children]
+        if not all(isinstance(arr, np.ndarray) for arr, _ in values):
+            # a sparse operand: pairwise through its kernels, never densified here
+            kernel = getattr(self.kernels, Elementwise.KERNELS[node.op])
+            out = values[0][0]
+            for arr, _ in values[1:]:
+                out = kernel(out, arr)
+            return out
+        # reuse a temporary we own as the output buffer, else allocate exactly one
+        base = next((i for i, (arr, owned) in enumerate(values) if owned and arr.dtype == node.dtype), None)
+        if base is None:
+            out = np.array(values[0][0], dtype=node.dtype)
+            rest = values[1:]
+        else:
+            out = values[base][0]
+            rest = values[:base] + values[base + 1:]
+        for arr, _ in rest:
+            ufunc(out, arr, out=out)
+        return out
+
+    def _matmul_chain(self, node: MatMulChain) -> Tuple[np.ndarray, bool]:
+        operands = [self.evaluate(child)[0] for child in node.children]
+        keys = [child.key for child in node.children]
+        dims = [operands[0].shape[0]] + [arr.shape[1] for arr in operands]
+        split = matmul_chain_order(dims)
+
+        last = len(operands) - 1
+
+        def product(i: int, j: int) -> np.ndarray:
+            if i == j:
+                return operands[i]
+            # sub-chains are shared between chains of the same evaluation
+            sub_key = ("matmul", tuple(keys[i:j + 1]))
+            cached = self.memo.get(sub_key)
+            if cached is not None:
+                return cached
+            k = split[i][j]
+            left, right = product(i, k), product(k + 1, j)
+            if isinstance(left, np.ndarray) and isinstance(right, np.ndarray):
+                arr = left @ right
+            else:
+                arr = self.kernels.matmul(left, right)
+            if (i, j) != (0, last):
+                self.memo[sub_key] = arr
+            return arr
+
+        sub_key = ("matmul", tuple(keys))
+        if sub_key in self.memo:
+            return self.memo[sub_key], False
+        return product(0, last), True
@@ -0,0 +1,168 @@
+from __future__ import annotations
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Hashable, List, Optional
+import threading
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __repr__(self) -> str:
+        return f"CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
+
+
+class BoundedCache:
+    # Thread-safe cache bounded by entry count and total bytes. Subclasses pick
+    # the eviction victim; the base class only does the bookkeeping.
+
+    def __init__(self, max_entries: Optional[int] = 1024, max_bytes: Optional[int] = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self.total_bytes = 0
+        self._entries: Dict[Hashable, Any] = {}
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.stats.misses += 1
+                return None
+            self.stats.hits += 1
+            self._touch(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_entries == 0 or (self.max_bytes is not None and nbytes > self.max_bytes):
+                return
+            while self._entries and self._needs_room(nbytes):
+                self._remove(self._victim())
+                self.stats.evictions += 1
+            self._entries[key] = value
+            self._sizes[key] = nbytes
+            self.total_bytes += nbytes
+            self._insert(key)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.stats = CacheStats()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _needs_room(self, nbytes: int) -> bool:
+        if self.max_entries is not None and len(self._entries) >= self.max_entries:
+            return True
+        return self.max_bytes is not None and self.total_bytes + nbytes > self.max_bytes
+
+    def _remove(self, key: Hashable) -> None:
+        del self._entries[key]
+        self.total_bytes -= self._sizes.pop(key)
+        self._forget(key)
+
+    def _insert(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def _touch(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def _forget(self, key: Hashable) -> None:
+        raise NotImplementedError
+
+    def _victim(self) -> Hashable:
+        raise NotImplementedError
+
+
+class LRUCache(BoundedCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._order: OrderedDict = OrderedDict()
+
+    def _insert(self, key: Hashable) -> None:
+        self._order[key] = None
+
+    def _touch(self, key: Hashable) -> None:
+        self._order.move_to_end(key)
+
+    def _forget(self, key: Hashable) -> None:
+        del self._order[key]
+
+    def _victim(self) -> Hashable:
+        return next(iter(self._order))
+
+
+class LFUCache(BoundedCache):
+    # keys grouped by use count, ties broken by least recent use
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._counts: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def _insert(self, key: Hashable) -> None:
+        self._counts[key] = 1
+        self._buckets[1][key] = None
+        self._min_count = 1
+
+    def _touch(self, key: Hashable) -> None:
+        count = self._counts[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._counts[key] = count + 1
+        self._buckets[count + 1][key] = None
+
+    def _forget(self, key: Hashable) -> None:
+        count = self._counts.pop(key)
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+        if self._buckets and self._min_count not in self._buckets:
+            self._min_count = min(self._buckets)
+
+    def _victim(self) -> Hashable:
+        return next(iter(self._buckets[self._min_count]))
+
+
+CACHE_POLICIES = {"lru": LRUCache, "lfu": LFUCache}
+
+
+def make_cache(policy: str = "lru", max_entries: Optional[int] = 1024,
+               max_bytes: Optional[int] = 256 * 1024 * 1024) -> BoundedCache:
+    try:
+        cls = CACHE_POLICIES[policy]
+    except KeyError:
+        raise ValueError(f"Unknown cache policy {policy!r}, expected one of {sorted(CACHE_POLICIES)}")
+    return cls(max_entries=max_entries, max_bytes=max_bytes)
@@ -0,0 +1,273 @@
+from __future__ import annotations
+from typing import Iterable, Optional, Tuple
+import io
+import lzma
+import os
+import struct
+import zlib
+import numpy as np
+
+BINARY_SUFFIX = ".hw3m"
+MAGIC = b"HW3MAT01"
+# same header, CSR payload: indptr (int64, rows + 1), indices (int64, nnz),
+# values (nnz), one after another, each raw or as its own compressed frames
+SPARSE_MAGIC = b"HW3CSR01"
+# magic, dtype (numpy str, e.g. b"<i8"), rows, cols, offset of the data,
+# codec (empty for a raw buffer that can be mapped as it is)
+HEADER = struct.Struct("<8s8sQQQ8s")
+# right after the header of a CSR file: number of stored values
+SPARSE_HEADER = struct.Struct("<Q")
+# the buffer starts on a page boundary so it can be mapped as it is
+DATA_OFFSET = 4096
+WRITE_CHUNK_BYTES = 64 * 1024 * 1024
+# compressed data is a sequence of frames: length, then the compressed row chunk
+FRAME = struct.Struct("<Q")
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+# elements formatted per write() by the text writer
+TEXT_CHUNK_ELEMS = 1 << 20
+
+
+def is_binary_path(path) -> bool:
+    return os.fspath(path).endswith(BINARY_SUFFIX)
+
+
+def _check_dtype(dtype: np.dtype) -> np.dtype:
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "biufc":
+        raise ValueError(f"Binary matrix files hold numeric data only, got dtype {dtype}")
+    return dtype
+
+
+def _check_codec(codec: Optional[str]) -> None:
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {sorted(CODECS)}")
+
+
+def write_header(f, shape: Tuple[int, int], dtype: np.dtype, codec: Optional[str] = None,
+                 magic: bytes = MAGIC, extra: bytes = b"") -> None:
+    dtype = _check_dtype(dtype)
+    _check_codec(codec)
+    f.write(HEADER.pack(magic, dtype.str.encode(), shape[0], shape[1], DATA_OFFSET, (codec or "").encode()))
+    f.write(extra)
+    f.write(b"\0" * (DATA_OFFSET - HEADER.size - len(extra)))
+
+
+def _unpack_header(f) -> Tuple[bytes, Tuple[int, int], np.dtype, int, Optional[str]]:
+    raw = f.read(HEADER.size)
+    if len(raw) != HEADER.size:
+        raise ValueError("Not a matrix file: header is truncated")
+    magic, dtype, rows, cols, offset, codec = HEADER.unpack(raw)
+    if magic not in (MAGIC, SPARSE_MAGIC):
+        raise ValueError("Not a matrix file: bad magic")
+    codec = codec.rstrip(b"\0").decode() or None
+    _check_codec(codec)
+    return magic, (rows, cols), _check_dtype(dtype.rstrip(b"\0").decode()), offset, codec
+
+
+def read_header(f) -> Tuple[Tuple[int, int], np.dtype, int, Optional[str]]:
+    magic, shape, dtype, offset, codec = _unpack_header(f)
+    if magic != MAGIC:
+        raise ValueError("Matrix file holds a sparse matrix, read it with load_csr()")
+    return shape, dtype, offset, codec
+
+
+def is_sparse_file(path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(SPARSE_MAGIC)) == SPARSE_MAGIC
+
+
+def create_memmap(path, shape: Tuple[int, int], dtype) -> np.memmap:
+    dtype = _check_dtype(dtype)
+    with open(path, "wb") as f:
+        write_header(f, shape, dtype)
+    if shape[0] * shape[1] == 0:
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode="r+", offset=DATA_OFFSET, shape=shape)
+
+
+def open_memmap(path, mode: str = "r") -> np.ndarray:
+    with open(path, "rb") as f:
+        shape, dtype, offset, codec = read_header(f)
+        size = os.fstat(f.fileno()).st_size
+    if codec is not None:
+        raise ValueError(f"Matrix file {path} is {codec}-compressed and cannot be mapped")
+    if size < offset + shape[0] * shape[1] * dtype.itemsize:
+        raise ValueError(f"Matrix file {path} is truncated")
+    if shape[0] * shape[1] == 0:
+        # mmap cannot map an empty range
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=shape)
+
+
+def _row_chunks(arr: np.ndarray, chunk_bytes: int):
+    row_bytes = max(arr.shape[1] * arr.dtype.itemsize, 1)
+    rows = max(chunk_bytes // row_bytes, 1)
+    for r0 in range(0, arr.shape[0], rows):
+        yield np.ascontiguousarray(arr[r0:r0 + rows])
+
+
+def _write_rows(f, arr: np.ndarray, codec: Optional[str]) -> None:
+    # row panels at a time: arr may itself be a memmap larger than RAM
+    if codec is None:
+        for chunk in _row_chunks(arr, WRITE_CHUNK_BYTES):
+            f.write(chunk.data)
+        return
+    compress = CODECS[codec][0]
+    for chunk in _row_chunks(arr, WRITE_CHUNK_BYTES):
+        frame = compress(chunk.data)
+        f.write(FRAME.pack(len(frame)))
+        f.write(frame)
+
+
+def save(path, arr: np.ndarray, codec: Optional[str] = None) -> None:
+    with open(path, "wb") as f:
+        write_header(f, arr.shape, arr.dtype, codec)
+        _write_rows(f, arr, codec)
+
+
+def save_csr(path, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray,
+             shape: Tuple[int, int], codec: Optional[str] = None) -> None:
+    # stored as it is held: a matrix with few values stays small on disk
+    # whatever its logical size
+    with open(path, "wb") as f:
+        write_header(f, shape, values.dtype, codec, SPARSE_MAGIC, SPARSE_HEADER.pack(len(values)))
+        for arr in (indptr.astype(np.int64, copy=False), indices.astype(np.int64, copy=False), values):
+            _write_rows(f, arr.reshape(-1, 1), codec)
+
+
+def _read_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Matrix file is truncated")
+    return data
+
+
+def _read_into(f, arr: np.ndarray, codec: Optional[str], path) -> np.ndarray:
+    if arr.size == 0:
+        return arr
+    buf = memoryview(arr).cast("B")
+    pos = 0
+    if codec is None:
+        # straight into the array: no intermediate bytes objects
+        while pos < len(buf):
+            n = f.readinto(buf[pos:])
+            if not n:
+                raise ValueError(f"Matrix file {path} is truncated")
+            pos += n
+        return arr
+    decompress = CODECS[codec][1]
+    while pos < len(buf):
+        (size,) = FRAME.unpack(_read_exact(f, FRAME.size))
+        data = decompress(_read_exact(f, size))
+        if pos + len(data) > len(buf):
+            raise ValueError(f"Matrix file {path} is corrupt")
+        buf[pos:pos + len(data)] = data
+        pos += len(data)
+    return arr
+
+
+def load(path, mmap: bool = True) -> np.ndarray:
+    with open(path, "rb") as f:
+        shape, dtype, offset, codec = read_header(f)
+        if codec is None and mmap:
+            return open_memmap(path)
+        f.seek(offset)
+        return _read_into(f, np.empty(shape, dtype), codec, path)
+
+
+def load_csr(path, mmap: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Tuple[int, int]]:
+    # (indptr, indices, values, shape); uncompressed arrays are mapped read-only
+    with open(path, "rb") as f:
+        magic, shape, dtype, offset, codec = _unpack_header(f)
+        if magic != SPARSE_MAGIC:
+            raise ValueError(f"Matrix file {path} holds a dense matrix, read it with load()")
+        (nnz,) = SPARSE_HEADER.unpack(_read_exact(f, SPARSE_HEADER.size))
+        parts = ((shape[0] + 1, np.dtype(np.int64)), (nnz, np.dtype(np.int64)), (nnz, dtype))
+        if codec is None:
+            size = os.fstat(f.fileno()).st_size
+            if size < offset + sum(n * t.itemsize for n, t in parts):
+                raise ValueError(f"Matrix file {path} is truncated")
+        f.seek(offset)
+        arrays = []
+        for n, t in parts:
+            if codec is None and mmap and n:
+                arrays.append(np.memmap(path, dtype=t, mode="r", offset=f.tell(), shape=(n,)))
+                f.seek(n * t.itemsize, os.SEEK_CUR)
+            else:
+                arrays.append(_read_into(f, np.empty(n, t), codec, path))
+    indptr, indices, values = arrays
+    if indptr[0] != 0 or indptr[-1] != nnz:
+        raise ValueError(f"Matrix file {path} is corrupt")
+    return indptr, indices, values, shape
+
+
+def text_blocks(arr: np.ndarray) -> Iterable[np.ndarray]:
+    rows = max(TEXT_CHUNK_ELEMS // max(arr.shape[1], 1), 1)
+    for r0 in range(0, arr.shape[0], rows):
+        yield arr[r0:r0 + rows]
+
+
+def write_text(f, blocks: Iterable[np.ndarray], ncols: int, fmt: str = "%s") -> None:
+    # the bracketed layout of __str__, one %-format per row instead of one
+    # str() per element, written a block of rows at a time
+    row_fmt = "[" + ", ".join([fmt] * ncols) + "]"
+    f.write("[")
+    first = True
+    for block in blocks:
+        rows = [row_fmt % tuple(row) for row in block.tolist()]
+        if not rows:
+            continue
+        if not first:
+            f.write(",\n ")
+        f.write(",\n ".join(rows))
+        first = False
+    f.write("]")
+
+
+def format_text(blocks: Iterable[np.ndarray], ncols: int, fmt: str = "%s") -> str:
+    out = io.StringIO()
+    write_text(out, blocks, ncols, fmt)
+    return out.getvalue()
+
+
+def _text_dtype(body: str) -> np.dtype:
+    if "True" in body or "False" in body:
+        return np.dtype(bool)
+    if "j" in body:
+        return np.dtype(complex)
+    if any(c in body for c in ".eEn"):
+        return np.dtype(float)
+    return np.dtype(np.int64)
+
+
+def read_text(path) -> np.ndarray:
+    with open(path, "r", encoding="utf-8") as f:
+        body = f.read().strip()
+    if not (body.startswith("[") and body.endswith("]")):
+        raise ValueError(f"{path} is not a bracketed matrix")
+    body = body[1:-1]
+    rows = body.count("[")
+    if rows == 0:
+        return np.zeros((0, 0), dtype=np.int64)
+    dtype = _text_dtype(body)
+    # "[1, 2],\n [3, 4]" -> " 1, 2 ,\n  3, 4 ": one flat comma separated list
+    flat = body.translate(str.maketrans("[]", "  "))
+    if not flat.strip(" \t\r\n,"):
+        # rows without columns
+        values = np.zeros(0, dtype)
+    elif dtype.kind in "bc":
+        tokens = [t.strip() for t in flat.split(",")]
+        if dtype.kind == "b":
+            values = np.array([t == "True" for t in tokens], dtype=bool)
+        else:
+            values = np.array([complex(t) for t in tokens], dtype=complex)
+    else:
+        values = np.fromstring(flat, dtype=dtype, sep=",")
+        if values.size != flat.count(",") + 1:
+            raise ValueError(f"{path}: malformed number")
+    if values.size % rows:
+        raise ValueError(f"{path}: rows have different lengths")
+    return values.reshape(rows, values.size // rows)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+import math
+import os
+import tempfile
+import numpy as np
+from matrix_io import BINARY_SUFFIX, create_memmap
+
+# bytes of operand/result tiles held in RAM at once
+DEFAULT_MEMORY = 256 * 1024 * 1024
+TILE_ALIGN = 64
+
+
+def is_mapped(arr) -> bool:
+    return isinstance(arr, np.memmap)
+
+
+def choose_tile(itemsize: int, max_memory: Optional[int] = None) -> int:
+    # a tile of A, a tile of B, their product and the accumulator
+    if max_memory is None:
+        max_memory = DEFAULT_MEMORY
+    tile = int(math.isqrt(max(max_memory // (4 * itemsize), 1)))
+    if tile > TILE_ALIGN:
+        tile -= tile % TILE_ALIGN
+    return max(tile, 1)
+
+
+def spill_memmap(shape: Tuple[int, int], dtype, directory: Optional[str] = None) -> np.ndarray:
+    # disk-backed scratch result: the file is unlinked right away and its
+    # space is released when the last mapping goes
+    fd, path = tempfile.mkstemp(suffix=BINARY_SUFFIX, dir=directory)
+    os.close(fd)
+    try:
+        return create_memmap(path, shape, dtype)
+    finally:
+        os.unlink(path)
+
+
+def _flush(out) -> None:
+    if is_mapped(out):
+        out.flush()
+
+
+def tiled_matmul(a: np.ndarray, b: np.ndarray, out: Optional[np.ndarray] = None,
+                 tile: Optional[int] = None, max_memory: Optional[int] = None,
+                 spill_dir: Optional[str] = None) -> np.ndarray:
+    n, k = a.shape
+    if b.shape[0] != k:
+        raise ValueError(f"Matmul: inner dimensions must be equal, got {a.shape} and {b.shape}")
+    m = b.shape[1]
+    dtype = np.result_type(a.dtype, b.dtype)
+    if out is None:
+        out = spill_memmap((n, m), dtype, spill_dir)
+    if tile is None:
+        tile = choose_tile(dtype.itemsize, max_memory)
+    acc = np.empty((tile, tile), dtype)
+    tmp = np.empty((tile, tile), dtype)
+    for i0 in range(0, n, tile):
+        i1 = min(i0 + tile, n)
+        for j0 in range(0, m, tile):
+            j1 = min(j0 + tile, m)
+            c = acc[:i1 - i0, :j1 - j0]
+            c[...] = 0
+            for k0 in range(0, k, tile):
+                k1 = min(k0 + tile, k)
+                # tiles are copied out of the mapping, so only they are resident
+                a_tile = np.asarray(a[i0:i1, k0:k1], dtype=dtype)
+                b_tile = np.asarray(b[k0:k1, j0:j1], dtype=dtype)
+                t = tmp[:i1 - i0, :j1 - j0]
+                np.matmul(a_tile, b_tile, out=t)
+                c += t
+            out[i0:i1, j0:j1] = c
+        # written row panels go back to disk instead of piling up as dirty pages
+        _flush(out)
+    return out
+
+
+def tiled_elementwise(ufunc, a: np.ndarray, b: np.ndarray, out: Optional[np.ndarray] = None,
+                      max_memory: Optional[int] = None, spill_dir: Optional[str] = None) -> np.ndarray:
+    if a.shape != b.shape:
+        raise ValueError(f"Elementwise op: shapes must match, got {a.shape} and {b.shape}")
+    dtype = np.result_type(a.dtype, b.dtype)
+    if out is None:
+        out = spill_memmap(a.shape, dtype, spill_dir)
+    if max_memory is None:
+        max_memory = DEFAULT_MEMORY
+    row_bytes = max(a.shape[1] * dtype.itemsize, 1)
+    rows = max(max_memory // (3 * row_bytes), 1)
+    for r0 in range(0, a.shape[0], rows):
+        r1 = r0 + rows
+        ufunc(a[r0:r1], b[r0:r1], out=out[r0:r1])
+        _flush(out)
+    return out
@@ -0,0 +1,109 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import os
+import numpy as np
+
+DEFAULT_TILE = 256
+EXECUTORS = ("thread", "process")
+
+Tile = Tuple[int, int, int, int]
+
+# per worker process: shared blocks attached once by the pool initializer
+_shared: Dict[str, np.ndarray] = {}
+_handles: List[shared_memory.SharedMemory] = []
+_tile_k = DEFAULT_TILE
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def output_tiles(n: int, m: int, tile: int) -> List[Tile]:
+    return [(i0, min(i0 + tile, n), j0, min(j0 + tile, m))
+            for i0 in range(0, n, tile) for j0 in range(0, m, tile)]
+
+
+def multiply_tile(a: np.ndarray, b: np.ndarray, out: np.ndarray, tile: Tile, tile_k: int) -> None:
+    # one output tile, accumulated over k blocks that stay in cache
+    i0, i1, j0, j1 = tile
+    k = a.shape[1]
+    if k == 0:
+        out[i0:i1, j0:j1] = 0
+        return
+    acc = a[i0:i1, 0:tile_k] @ b[0:tile_k, j0:j1]
+    for k0 in range(tile_k, k, tile_k):
+        acc += a[i0:i1, k0:k0 + tile_k] @ b[k0:k0 + tile_k, j0:j1]
+    out[i0:i1, j0:j1] = acc
+
+
+def _attach(specs: Dict[str, Tuple[str, Tuple[int, int], str]], tile_k: int) -> None:
+    global _tile_k
+    _tile_k = tile_k
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _handles.append(shm)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _process_tile(tile: Tile) -> None:
+    multiply_tile(_shared["a"], _shared["b"], _shared["out"], tile, _tile_k)
+
+
+def _process_matmul(a: np.ndarray, b: np.ndarray, shape: Tuple[int, int], tiles: List[Tile],
+                    workers: int, tile_k: int) -> np.ndarray:
+    # operands and result live in shared memory: workers get names, not pickled arrays
+    blocks, views, specs = [], {}, {}
+    try:
+        for key, src, block_shape in (("a", a, a.shape), ("b", b, b.shape), ("out", None, shape)):
+            nbytes = block_shape[0] * block_shape[1] * a.dtype.itemsize
+            shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+            blocks.append(shm)
+            views[key] = np.ndarray(block_shape, dtype=a.dtype, buffer=shm.buf)
+            if src is not None:
+                views[key][...] = src
+            specs[key] = (shm.name, block_shape, a.dtype.str)
+        chunksize = max(len(tiles) // (4 * workers), 1)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(specs, tile_k)) as ex:
+            for _ in ex.map(_process_tile, tiles, chunksize=chunksize):
+                pass
+        return views["out"].copy()
+    finally:
+        views.clear()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def parallel_matmul(a: np.ndarray, b: np.ndarray, workers: Optional[int] = None,
+                    tile: Optional[int] = None, executor: str = "thread") -> np.ndarray:
+    if a.ndim != 2 or b.ndim != 2 or a.shape[1] != b.shape[0]:
+        raise ValueError(f"Matmul: inner dimensions must be equal, got {a.shape} and {b.shape}")
+    if executor not in EXECUTORS:
+        raise ValueError(f"Unknown executor {executor!r}, expected one of {EXECUTORS}")
+    if workers is None:
+        workers = default_workers()
+    if tile is None:
+        tile = DEFAULT_TILE
+    if workers < 1 or tile < 1:
+        raise ValueError("workers and tile must be positive")
+    dtype = np.result_type(a.dtype, b.dtype)
+    a = np.ascontiguousarray(a, dtype=dtype)
+    b = np.ascontiguousarray(b, dtype=dtype)
+    shape = (a.shape[0], b.shape[1])
+    tiles = output_tiles(shape[0], shape[1], tile)
+    if workers == 1 or len(tiles) <= 1:
+        out = np.empty(shape, dtype)
+        for t in tiles:
+            multiply_tile(a, b, out, t, tile)
+        return out
+    workers = min(workers, len(tiles))
+    if executor == "process":
+        return _process_matmul(a, b, shape, tiles, workers, tile)
+    # numpy drops the GIL inside matmul loops, so threads run tiles in parallel
+    out = np.empty(shape, dtype)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for _ in ex.map(lambda t: multiply_tile(a, b, out, t, tile), tiles):
+            pass
+    return out
@@ -0,0 +1,320 @@
+from __future__ import annotations
+from typing import Iterator, Tuple
+import hashlib
+import numpy as np
+
+# upper bound on temporaries (elements) created by one step of a sparse kernel
+KERNEL_CHUNK = 1 << 22
+
+
+def _row_ids(indptr: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+
+
+def _segments(counts: np.ndarray, limit: int) -> Iterator[Tuple[int, int]]:
+    # consecutive [start, stop) runs of items whose counts add up to about `limit`
+    bounds = np.cumsum(counts, dtype=np.int64)
+    start = 0
+    n = len(counts)
+    while start < n:
+        base = bounds[start - 1] if start else 0
+        stop = int(np.searchsorted(bounds, base + limit, side="right"))
+        stop = min(max(stop, start + 1), n)
+        yield start, stop
+        start = stop
+
+
+class CSRData:
+    # Compressed sparse rows: row i holds indices/values[indptr[i]:indptr[i+1]],
+    # column indices sorted and unique within a row, no explicit zeros.
+    format = "csr"
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, shape: Tuple[int, int]):
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.shape = (int(shape[0]), int(shape[1]))
+        for arr in (indptr, indices, values):
+            arr.flags.writeable = False
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape: Tuple[int, int]) -> "CSRData":
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        cols = np.asarray(cols, dtype=np.int64).ravel()
+        values = np.asarray(values).ravel()
+        n_rows, n_cols = int(shape[0]), int(shape[1])
+        if not (len(rows) == len(cols) == len(values)):
+            raise ValueError("COO rows, cols and values must have the same length")
+        if len(rows) and (rows.min() < 0 or rows.max() >= n_rows or cols.min() < 0 or cols.max() >= n_cols):
+            raise ValueError(f"COO indices out of bounds for shape {(n_rows, n_cols)}")
+        # duplicates are summed, zeros dropped
+        keys = rows * n_cols + cols
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+        summed = np.add.reduceat(values[order], starts) if len(keys) else values[:0]
+        keys = keys[starts]
+        keep = summed != 0
+        keys, summed = keys[keep], summed[keep]
+        rows, cols = np.divmod(keys, n_cols) if n_cols else (keys, keys)
+        indptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int64), summed, (n_rows, n_cols))
+
+    @classmethod
+    def from_dense(cls, arr: np.ndarray) -> "CSRData":
+        rows, cols = np.nonzero(arr)
+        indptr = np.zeros(arr.shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=arr.shape[0]), out=indptr[1:])
+        return cls(indptr, cols.astype(np.int64), arr[rows, cols], arr.shape)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.values.dtype
+
+    @property
+    def nnz(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.values.nbytes
+
+    def density(self) -> float:
+        size = self.shape[0] * self.shape[1]
+        return self.nnz / size if size else 0.0
+
+    def to_coo(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return _row_ids(self.indptr), self.indices, self.values
+
+    def to_csr(self) -> "CSRData":
+        return self
+
+    def to_dense(self) -> np.ndarray:
+        out = np.zeros(self.shape, dtype=self.dtype)
+        rows, cols, values = self.to_coo()
+        out[rows, cols] = values
+        return out
+
+    def row_dense(self, i: int) -> np.ndarray:
+        out = np.zeros(self.shape[1], dtype=self.dtype)
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        out[self.indices[lo:hi]] = self.values[lo:hi]
+        return out
+
+    def iter_dense_rows(self) -> Iterator[np.ndarray]:
+        for i in range(self.shape[0]):
+            yield self.row_dense(i)
+
+    def transpose(self) -> "CSRData":
+        rows, cols, values = self.to_coo()
+        return CSRData.from_coo(cols, rows, values, (self.shape[1], self.shape[0]))
+
+    def sum(self):
+        return self.values.sum()
+
+    def digest(self) -> bytes:
+        h = hashlib.blake2b(digest_size=32)
+        h.update(self.format.encode())
+        h.update(self.values.dtype.str.encode())
+        h.update(np.asarray(self.shape, dtype=np.int64).tobytes())
+        for arr in (self.indptr, self.indices, self.values):
+            h.update(np.ascontiguousarray(arr).data)
+        return h.digest()
+
+    def equals(self, other) -> bool:
+        return (type(other) is type(self) and self.shape == other.shape
+                and np.array_equal(self.indptr, other.indptr)
+                and np.array_equal(self.indices, other.indices)
+                and np.array_equal(self.values, other.values))
+
+    # elementwise
+
+    def add(self, other: "CSRData") -> "CSRData":
+        r1, c1, v1 = self.to_coo()
+        r2, c2, v2 = other.to_coo()
+        return CSRData.from_coo(np.concatenate([r1, r2]), np.concatenate([c1, c2]),
+                                np.concatenate([v1, v2.astype(np.result_type(v1, v2))]), self.shape)
+
+    def add_dense(self, dense: np.ndarray) -> np.ndarray:
+        out = dense.astype(np.result_type(self.dtype, dense.dtype), copy=True)
+        rows, cols, values = self.to_coo()
+        out[rows, cols] += values
+        return out
+
+    def multiply(self, other: "CSRData") -> "CSRData":
+        n_cols = self.shape[1]
+        r1, c1, v1 = self.to_coo()
+        r2, c2, v2 = other.to_coo()
+        keys, i1, i2 = np.intersect1d(r1 * n_cols + c1, r2 * n_cols + c2,
+                                      assume_unique=True, return_indices=True)
+        rows, cols = np.divmod(keys, n_cols)
+        return CSRData.from_coo(rows, cols, v1[i1] * v2[i2], self.shape)
+
+    def multiply_dense(self, dense: np.ndarray) -> "CSRData":
+        rows, cols, values = self.to_coo()
+        return CSRData.from_coo(rows, cols, values * dense[rows, cols], self.shape)
+
+    # products
+
+    def matmul_dense(self, dense: np.ndarray) -> np.ndarray:
+        # rows are sorted, so per-row sums are one reduceat per chunk of nonzeros
+        out = np.zeros((self.shape[0], dense.shape[1]), dtype=np.result_type(self.dtype, dense.dtype))
+        if self.nnz == 0 or dense.shape[1] == 0:
+            return out
+        rows, cols, values = self.to_coo()
+        step = max(1, KERNEL_CHUNK // max(dense.shape[1], 1))
+        for lo in range(0, self.nnz, step):
+            hi = min(lo + step, self.nnz)
+            contrib = values[lo:hi, None] * dense[cols[lo:hi]]
+            chunk_rows = rows[lo:hi]
+            starts = np.flatnonzero(np.r_[True, chunk_rows[1:] != chunk_rows[:-1]])
+            out[chunk_rows[starts]] += np.add.reduceat(contrib, starts, axis=0)
+        return out
+
+    def rmatmul_dense(self, dense: np.ndarray) -> np.ndarray:
+        # dense @ self == (self.T @ dense.T).T
+        return self.transpose().matmul_dense(dense.T).T
+
+    def matmul(self, other: "CSRData") -> "CSRData":
+        # Gustavson-style expansion: every a[i, k] meets row k of `other`
+        a_rows, a_cols, a_vals = self.to_coo()
+        b_counts = np.diff(other.indptr)
+        counts = b_counts[a_cols]
+        dtype = np.result_type(self.dtype, other.dtype)
+        parts_r, parts_c, parts_v = [], [], []
+        for lo, hi in _segments(counts, KERNEL_CHUNK):
+            cnt = counts[lo:hi]
+            total = int(cnt.sum())
+            if total == 0:
+                continue
+            starts = np.repeat(other.indptr[a_cols[lo:hi]], cnt)
+            offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            idx = starts + offsets
+            parts_r.append(np.repeat(a_rows[lo:hi], cnt))
+            parts_c.append(other.indices[idx])
+            parts_v.append((np.repeat(a_vals[lo:hi], cnt) * other.values[idx]).astype(dtype, copy=False))
+        if not parts_r:
+            return CSRData.from_coo([], [], np.zeros(0, dtype=dtype), (self.shape[0], other.shape[1]))
+        return CSRData.from_coo(np.concatenate(parts_r), np.concatenate(parts_c),
+                                np.concatenate(parts_v), (self.shape[0], other.shape[1]))
+
+
+class BlockSparseData:
+    # Block-sparse rows: dense block_size x block_size tiles stored for the
+    # nonzero tiles only; the last block row/column may overhang the shape.
+    format = "bsr"
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, blocks: np.ndarray,
+                 shape: Tuple[int, int], block_size: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.blocks = blocks
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.block_size = int(block_size)
+        for arr in (indptr, indices, blocks):
+            arr.flags.writeable = False
+
+    @classmethod
+    def from_csr(cls, csr: CSRData, block_size: int) -> "BlockSparseData":
+        bs = int(block_size)
+        n_br = -(-csr.shape[0] // bs)
+        n_bc = -(-csr.shape[1] // bs)
+        rows, cols, values = csr.to_coo()
+        block_keys = (rows // bs) * n_bc + cols // bs
+        keys, inverse = np.unique(block_keys, return_inverse=True)
+        blocks = np.zeros((len(keys), bs, bs), dtype=csr.dtype)
+        blocks[inverse, rows % bs, cols % bs] = values
+        block_rows, block_cols = np.divmod(keys, n_bc) if n_bc else (keys, keys)
+        indptr = np.zeros(n_br + 1, dtype=np.int64)
+        np.cumsum(np.bincount(block_rows, minlength=n_br), out=indptr[1:])
+        return cls(indptr, block_cols.astype(np.int64), blocks, csr.shape, bs)
+
+    @classmethod
+    def from_dense(cls, arr: np.ndarray, block_size: int) -> "BlockSparseData":
+        return cls.from_csr(CSRData.from_dense(arr), block_size)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.blocks.dtype
+
+    @property
+    def nnz(self) -> int:
+        return int(np.count_nonzero(self.blocks))
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.blocks.nbytes
+
+    def density(self) -> float:
+        size = self.shape[0] * self.shape[1]
+        return self.nnz / size if size else 0.0
+
+    def to_csr(self) -> CSRData:
+        bs = self.block_size
+        block_rows = _row_ids(self.indptr)
+        b, r, c = np.nonzero(self.blocks)
+        return CSRData.from_coo(block_rows[b] * bs + r, self.indices[b] * bs + c,
+                                self.blocks[b, r, c], self.shape)
+
+    def to_coo(self):
+        return self.to_csr().to_coo()
+
+    def to_dense(self) -> np.ndarray:
+        return self.to_csr().to_dense()
+
+    def iter_dense_rows(self) -> Iterator[np.ndarray]:
+        bs = self.block_size
+        n_bc = -(-self.shape[1] // bs)
+        for br in range(len(self.indptr) - 1):
+            slab = np.zeros((bs, n_bc * bs), dtype=self.dtype)
+            for j in range(self.indptr[br], self.indptr[br + 1]):
+                bc = self.indices[j]
+                slab[:, bc * bs:(bc + 1) * bs] = self.blocks[j]
+            for r in range(min(bs, self.shape[0] - br * bs)):
+                yield slab[r, :self.shape[1]]
+
+    def sum(self):
+        return self.blocks.sum()
+
+    def digest(self) -> bytes:
+        h = hashlib.blake2b(digest_size=32)
+        h.update(self.format.encode())
+        h.update(self.blocks.dtype.str.encode())
+        h.update(np.asarray(self.shape + (self.block_size,), dtype=np.int64).tobytes())
+        for arr in (self.indptr, self.indices, self.blocks):
+            h.update(np.ascontiguousarray(arr).data)
+        return h.digest()
+
+    def equals(self, other) -> bool:
+        return (type(other) is type(self) and self.shape == other.shape
+                and self.block_size == other.block_size
+                and np.array_equal(self.indptr, other.indptr)
+                and np.array_equal(self.indices, other.indices)
+                and np.array_equal(self.blocks, other.blocks))
+
+    def matmul_dense(self, dense: np.ndarray) -> np.ndarray:
+        # each stored tile multiplies one block-row slab of `dense` in a batched matmul
+        bs = self.block_size
+        n_br = len(self.indptr) - 1
+        n_bc = -(-self.shape[1] // bs)
+        k = dense.shape[1]
+        dtype = np.result_type(self.dtype, dense.dtype)
+        if dense.shape[0] != n_bc * bs:
+            padded = np.zeros((n_bc * bs, k), dtype=dense.dtype)
+            padded[:dense.shape[0]] = dense
+            dense = padded
+        slabs = dense.reshape(n_bc, bs, k)
+        out = np.zeros((n_br, bs, k), dtype=dtype)
+        block_rows = _row_ids(self.indptr)
+        step = max(1, KERNEL_CHUNK // max(bs * k, 1))
+        for lo in range(0, len(self.indices), step):
+            hi = min(lo + step, len(self.indices))
+            prod = np.matmul(self.blocks[lo:hi], slabs[self.indices[lo:hi]])
+            chunk_rows = block_rows[lo:hi]
+            starts = np.flatnonzero(np.r_[True, chunk_rows[1:] != chunk_rows[:-1]])
+            out[chunk_rows[starts]] += np.add.reduceat(prod, starts, axis=0)
+        return out.reshape(n_br * bs, k)[:self.shape[0]]
+
+    def rmatmul_dense(self, dense: np.ndarray) -> np.ndarray:
+        return self.to_csr().rmatmul_dense(dense)
@@ -0,0 +1,317 @@
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not POSIX: no rusage, RSS is not reported
+    resource = None
+
+DEFAULT_WARMUP = 1
+DEFAULT_MIN_TIME = 1.0
+MIN_REPEATS = 3
+MAX_REPEATS = 100
+# a median this much slower than the baseline counts as a regression
+DEFAULT_THRESHOLD = 0.10
+PERCENTILES = (5, 25, 75, 95)
+PROC = "/proc"
+# rss_scope of a sample: peak of this run, or the peak of the whole lifetime
+# where it cannot be reset between runs
+RSS_RUN = "run"
+RSS_LIFETIME = "lifetime"
+
+
+class Sample(NamedTuple):
+    wall: float
+    # this process and its children, live pool workers included where /proc has them
+    cpu: float
+    # peak resident set of this process or any child, in KiB
+    rss_kb: Optional[int]
+    rss_scope: str = RSS_LIFETIME
+
+
+class BenchResult:
+    def __init__(self, name: str, params: Dict[str, Any], samples: List[Sample]):
+        self.name = name
+        self.params = params
+        self.samples = samples
+
+    @property
+    def key(self) -> str:
+        if not self.params:
+            return self.name
+        return self.name + "[" + ",".join(f"{k}={v}" for k, v in self.params.items()) + "]"
+
+    def summary(self) -> Dict[str, Any]:
+        out = summarize([s.wall for s in self.samples])
+        out["cpu_median"] = statistics.median(s.cpu for s in self.samples)
+        rss = [s.rss_kb for s in self.samples if s.rss_kb is not None]
+        out["rss_peak_kb"] = max(rss) if rss else None
+        out["rss_scope"] = RSS_RUN if all(s.rss_scope == RSS_RUN for s in self.samples) else RSS_LIFETIME
+        return out
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "key": self.key, "params": self.params, "summary": self.summary(),
+                "samples": [s._asdict() for s in self.samples]}
+
+
+def _cpu_time() -> float:
+    # this process plus waited-for children (process pools, mp.Process)
+    if resource is None:
+        t = os.times()
+        return t.user + t.system + t.children_user + t.children_system
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _live_children() -> List[int]:
+    # children of every thread of this process; rusage only sees them once
+    # they are reaped, which never happens to a warm pool
+    pids = []
+    try:
+        for task in os.listdir(f"{PROC}/self/task"):
+            with open(f"{PROC}/self/task/{task}/children", "r") as f:
+                pids.extend(int(pid) for pid in f.read().split())
+    except OSError:
+        return []
+    return pids
+
+
+def _proc_cpu(pids: List[int]) -> Dict[int, float]:
+    ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+    out = {}
+    for pid in pids:
+        try:
+            with open(f"{PROC}/{pid}/stat", "r") as f:
+                # fields after the parenthesised command; utime and stime are 14 and 15
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        out[pid] = (int(fields[11]) + int(fields[12])) / ticks
+    return out
+
+
+def _reset_peak_rss(pids: List[int]) -> bool:
+    # "5" resets VmHWM (Linux 4.0+), making the next reading a per-run peak
+    try:
+        for pid in ["self"] + [str(p) for p in pids]:
+            with open(f"{PROC}/{pid}/clear_refs", "w") as f:
+                f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def _proc_peak_rss_kb(pids: List[int]) -> Optional[int]:
+    peak = None
+    for pid in ["self"] + [str(p) for p in pids]:
+        try:
+            with open(f"{PROC}/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        kb = int(line.split()[1])
+                        peak = kb if peak is None else max(peak, kb)
+                        break
+        except (OSError, ValueError):
+            continue
+    return peak
+
+
+def _peak_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak = max(self_rss, children_rss)
+    # bytes on macOS, KiB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _snapshot() -> Tuple[float, Dict[int, float]]:
+    return _cpu_time(), _proc_cpu(_live_children())
+
+
+def _cpu_since(start: Tuple[float, Dict[int, float]], end: Tuple[float, Dict[int, float]]) -> float:
+    # a worker live at both ends counts by its delta, a new one in full; one
+    # that was reaped meanwhile is in the rusage delta whole, so its time
+    # before the run comes off again
+    (cpu0, live0), (cpu1, live1) = start, end
+    workers = sum(t - live0.get(pid, 0.0) for pid, t in live1.items())
+    reaped = sum(t for pid, t in live0.items() if pid not in live1)
+    return cpu1 - cpu0 + workers - reaped
+
+
+def measure(func: Callable, *args, **kwargs) -> Sample:
+    per_run = _reset_peak_rss(_live_children())
+    start = _snapshot()
+    t0 = time.perf_counter()
+    func(*args, **kwargs)
+    wall = time.perf_counter() - t0
+    end = _snapshot()
+    if per_run:
+        # workers started during the run were never reset, their peak is this run's anyway
+        return Sample(wall, _cpu_since(start, end), _proc_peak_rss_kb(list(end[1])), RSS_RUN)
+    return Sample(wall, _cpu_since(start, end), _peak_rss_kb(), RSS_LIFETIME)
+
+
+def run_benchmark(name: str, func: Callable, *args, params: Optional[Dict[str, Any]] = None,
+                  warmup: int = DEFAULT_WARMUP, repeats: Optional[int] = None,
+                  min_time: float = DEFAULT_MIN_TIME, verbose: bool = True, **kwargs) -> BenchResult:
+    # warmup runs are discarded; without an explicit repeat count, enough runs
+    # to fill min_time are taken, calibrated on the last warmup (or first) run
+    probe = None
+    for _ in range(warmup):
+        probe = measure(func, *args, **kwargs)
+    samples = []
+    if repeats is None:
+        if probe is None:
+            probe = measure(func, *args, **kwargs)
+            samples.append(probe)
+        repeats = math.ceil(min_time / probe.wall) if probe.wall > 0 else MAX_REPEATS
+        repeats = min(max(repeats, MIN_REPEATS), MAX_REPEATS)
+    while len(samples) < repeats:
+        samples.append(measure(func, *args, **kwargs))
+        if verbose:
+            print(f"{name} {params or ''} run {len(samples)}/{repeats}: {samples[-1].wall:.4f}s")
+    return BenchResult(name, dict(params or {}), samples)
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    out = {
+        "runs": len(times),
+        "mean": statistics.fmean(times),
+        "median": statistics.median(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "min": min(times),
+        "max": max(times),
+    }
+    if len(times) > 1:
+        cuts = statistics.quantiles(times, n=100, method="inclusive")
+        for p in PERCENTILES:
+            out[f"p{p}"] = cuts[p - 1]
+    else:
+        for p in PERCENTILES:
+            out[f"p{p}"] = times[0]
+    return out
+
+
+def format_result(result: BenchResult) -> str:
+    s = result.summary()
+    head = (f"runs: {s['runs']}, avg: {s['mean']:.4f}s, median: {s['median']:.4f}s, "
+            f"stdev: {s['stdev']:.4f}s, min: {s['min']:.4f}s, max: {s['max']:.4f}s, "
+            f"p5: {s['p5']:.4f}s, p95: {s['p95']:.4f}s, cpu: {s['cpu_median']:.4f}s")
+    if s["rss_peak_kb"] is not None:
+        scope = "per run" if s["rss_scope"] == RSS_RUN else "lifetime"
+        head += f", peak rss ({scope}): {s['rss_peak_kb']} KiB"
+    return head + "\n" + "\n".join(f"{i+1:2d}: {sample.wall:.4f}s" for i, sample in enumerate(result.samples))
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def environment() -> Dict[str, Any]:
+    gil = getattr(sys, "_is_gil_enabled", None)
+    return {
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "gil_enabled": gil() if gil is not None else True,
+        "git_commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def write_json(path: str, results: List[BenchResult], env: Optional[Dict[str, Any]] = None,
+               title: str = "") -> None:
+    doc = {"title": title, "environment": env or environment(), "results": [r.as_dict() for r in results]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+
+
+def write_csv(path: str, results: List[BenchResult]) -> None:
+    fields = ["key", "name", "params", "runs", "mean", "median", "stdev", "min", "max"] \
+        + [f"p{p}" for p in PERCENTILES] + ["cpu_median", "rss_peak_kb", "rss_scope"]
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for r in results:
+            row = {"key": r.key, "name": r.name, "params": json.dumps(r.params)}
+            row.update(r.summary())
+            writer.writerow(row)
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return {r["key"]: r["summary"]["median"] for r in doc["results"]}
+
+
+def compare(results: List[BenchResult], baseline: Dict[str, float],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    lines = []
+    for r in results:
+        base = baseline.get(r.key)
+        if base is None or base <= 0:
+            continue
+        median = r.summary()["median"]
+        change = median / base - 1.0
+        if change > threshold:
+            lines.append(f"REGRESSION {r.key}: median {median:.4f}s vs baseline {base:.4f}s ({change:+.1%})")
+    return lines
+
+
+def add_arguments(parser: argparse.ArgumentParser, out: str, repeats: Optional[int] = None) -> None:
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="discarded runs per benchmark")
+    parser.add_argument("--repeats", type=int, default=repeats,
+                        help=f"measured runs per benchmark, 0 to calibrate to --min-time (default {repeats or 0})")
+    parser.add_argument("--min-time", type=float, default=DEFAULT_MIN_TIME,
+                        help="seconds of measured runs to aim for when calibrating")
+    parser.add_argument("--out", default=out, help=f"text report (default {out})")
+    parser.add_argument("--json", help="write results and environment as JSON")
+    parser.add_argument("--csv", help="write summary rows as CSV")
+    parser.add_argument("--baseline", help="JSON report to compare medians against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="relative median slowdown reported as a regression")
+
+
+def bench_options(args: argparse.Namespace) -> Dict[str, Any]:
+    return {"warmup": args.warmup, "repeats": args.repeats or None, "min_time": args.min_time}
+
+
+def write_reports(args: argparse.Namespace, title: str, report: str, results: List[BenchResult]) -> int:
+    # returns the exit status: 1 when a baseline comparison found regressions
+    with open(args.out, "w", encoding="utf-8") as f:
+        f.write(report)
+    print("\nReport written to:", args.out)
+    env = environment()
+    if args.json:
+        write_json(args.json, results, env, title)
+        print("JSON written to:", args.json)
+    if args.csv:
+        write_csv(args.csv, results)
+        print("CSV written to:", args.csv)
+    if args.baseline:
+        regressions = compare(results, load_baseline(args.baseline), args.threshold)
+        for line in regressions:
+            print(line)
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
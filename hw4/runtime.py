@@ -0,0 +1,76 @@
+import concurrent.futures
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+BACKENDS = ("sync", "threads", "processes", "interpreters")
+# chunks per worker: enough to even out uneven tasks, few enough to keep
+# per-submit overhead small
+CHUNKS_PER_WORKER = 4
+
+
+def _run_chunk(func: Callable, chunk: List) -> List:
+    return [func(item) for item in chunk]
+
+
+def interpreters_available() -> bool:
+    return hasattr(concurrent.futures, "InterpreterPoolExecutor")
+
+
+# Fixed-size worker pool with chunked submission and ordered results. Every
+# backend gets the same chunks in the same order, so sync, threads (GIL or
+# free-threaded), processes and subinterpreters differ only in where a
+# chunk runs. The pool is created once and reused across map() calls.
+class TaskRuntime:
+    def __init__(self, backend: str = "processes", workers: Optional[int] = None,
+                 chunksize: Optional[int] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        if backend == "interpreters" and not interpreters_available():
+            raise RuntimeError("The interpreters backend needs concurrent.futures.InterpreterPoolExecutor "
+                               "(Python 3.14+)")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            if self.backend == "threads":
+                self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            elif self.backend == "processes":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._pool = concurrent.futures.InterpreterPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def chunks(self, items: List) -> List[List]:
+        size = self.chunksize or max(1, math.ceil(len(items) / (self.workers * CHUNKS_PER_WORKER)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def map(self, func: Callable, items: Iterable) -> List:
+        chunks = self.chunks(list(items))
+        if self.backend == "sync":
+            parts = [_run_chunk(func, chunk) for chunk in chunks]
+        else:
+            ex = self._executor()
+            futures = [ex.submit(_run_chunk, func, chunk) for chunk in chunks]
+            parts = [fut.result() for fut in futures]
+        return [result for part in parts for result in part]
+
+    def warm_up(self) -> None:
+        # start every worker now so the first map() does not pay for it
+        if self.backend != "sync":
+            self.map(abs, range(self.workers * CHUNKS_PER_WORKER))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "TaskRuntime":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
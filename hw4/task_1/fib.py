@@ -1,13 +1,43 @@
+import argparse
+import sys
 import time
 import threading
 import multiprocessing as mp
-from typing import List
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bench  # noqa: E402
+from runtime import BACKENDS, TaskRuntime, interpreters_available  # noqa: E402
 
 def fib(n: int) -> int:
     if n < 2:
         return n
     return fib(n - 1) + fib(n - 2)
 
+# per worker process, so it carries over between the tasks a pool worker runs
+_fib_table: List[int] = [0, 1]
+
+def fib_memo(n: int) -> int:
+    table = _fib_table
+    while len(table) <= n:
+        table.append(table[-1] + table[-2])
+    return table[n]
+
+def fib_fast(n: int) -> int:
+    # fast doubling: F(2k) = F(k)(2F(k+1) - F(k)), F(2k+1) = F(k)^2 + F(k+1)^2
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        c = a * (2 * b - a)
+        d = a * a + b * b
+        if bit == "1":
+            a, b = d, c + d
+        else:
+            a, b = c, d
+    return a
+
+IMPLEMENTATIONS = {"naive": fib, "memo": fib_memo, "fast": fib_fast}
+
 def run_sync(n: int, tasks: int) -> float:
     t0 = time.perf_counter()
     for _ in range(tasks):
@@ -39,59 +69,63 @@ def run_processes(n: int, tasks: int) -> float:
     t1 = time.perf_counter()
     return t1 - t0
 
-def summarize(times: List[float]) -> str:
-    avg = sum(times) / len(times)
-    mn = min(times)
-    mx = max(times)
-    return f"runs: {len(times)}, avg: {avg:.4f}s, min: {mn:.4f}s, max: {mx:.4f}s\n" \
-           + "\n".join(f"{i+1:2d}: {t:.4f}s" for i, t in enumerate(times))
+def run_runtime(runtime: TaskRuntime, n: int, tasks: int, impl: str = "naive") -> float:
+    t0 = time.perf_counter()
+    runtime.map(IMPLEMENTATIONS[impl], [n] * tasks)
+    t1 = time.perf_counter()
+    return t1 - t0
 
-def main():
-    n = 30
-    repeats = 10
-    tasks = 10
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="fib.py", description="Benchmark fib(n) run sync, in threads and in processes.")
+    parser.add_argument("-n", type=int, default=30, help="fib argument (default 30)")
+    parser.add_argument("--tasks", type=int, default=10, help="fib calls per run (default 10)")
+    parser.add_argument("--impl", choices=sorted(IMPLEMENTATIONS), default="naive",
+                        help="fib used by the pooled runtime (default naive)")
+    parser.add_argument("--workers", type=int, default=None, help="pool size of the runtime (default CPUs)")
+    parser.add_argument("--chunksize", type=int, default=None, help="tasks per submitted chunk (default auto)")
+    bench.add_arguments(parser, out="task_1/artifacts.txt", repeats=10)
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    n = args.n
+    tasks = args.tasks
+    repeats = args.repeats or "calibrated"
 
     print(f"Platform: CPUs={mp.cpu_count()}")
-    print(f"Parameters: n={n}, tasks={tasks}, repeats={repeats}")
-
-    sync_times = []
-    thread_times = []
-    process_times = []
-
-    for rep in range(1, repeats + 1):
-        print(f"\n--- Repeat {rep}/{repeats} ---")
-
-        print("Running sync...")
-        t_sync = run_sync(n, tasks)
-        print(f"sync total: {t_sync:.4f}s")
-        sync_times.append(t_sync)
-
-        print("Running threads...")
-        t_threads = run_threads(n, tasks)
-        print(f"threads total: {t_threads:.4f}s")
-        thread_times.append(t_threads)
-
-        print("Running processes...")
-        t_procs = run_processes(n, tasks)
-        print(f"processes total: {t_procs:.4f}s")
-        process_times.append(t_procs)
+    print(f"Parameters: n={n}, tasks={tasks}, repeats={repeats}, warmup={args.warmup}")
+
+    options = bench.bench_options(args)
+    params = {"n": n, "tasks": tasks}
+    results = [
+        bench.run_benchmark("sync", run_sync, n, tasks, params=params, **options),
+        bench.run_benchmark("threads", run_threads, n, tasks, params=params, **options),
+        bench.run_benchmark("processes", run_processes, n, tasks, params=params, **options),
+    ]
+    titles = ["SYNCHRONOUS", "THREADS", "PROCESSES"]
+
+    # the same chunks on a reused fixed-size pool of every available backend
+    backends = [b for b in BACKENDS if b != "interpreters" or interpreters_available()]
+    pooled: Dict[str, bench.BenchResult] = {}
+    for backend in backends:
+        with TaskRuntime(backend, args.workers, args.chunksize) as runtime:
+            runtime.warm_up()
+            pool_params = dict(params, impl=args.impl, workers=runtime.workers)
+            pooled[backend] = bench.run_benchmark(f"pool-{backend}", run_runtime, runtime, n, tasks, args.impl,
+                                                  params=pool_params, **options)
+        results.append(pooled[backend])
+        titles.append(f"POOLED RUNTIME, {backend.upper()} ({args.impl})")
 
     report_lines = []
-    report_lines.append("SYNCHRONOUS:\n")
-    report_lines.append(summarize(sync_times))
-    report_lines.append("\nTHREADS:\n")
-    report_lines.append(summarize(thread_times))
-    report_lines.append("\nPROCESSES:\n")
-    report_lines.append(summarize(process_times))
+    for title, result in zip(titles, results):
+        report_lines.append(f"\n{title}:\n" if report_lines else f"{title}:\n")
+        report_lines.append(bench.format_result(result))
 
     report = "\n".join(report_lines)
-    out_path = "task_1/artifacts.txt"
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(report)
-
-    print("\nReport written to:", out_path)
+    status = bench.write_reports(args, f"fib({n}) x {tasks}", report, results)
     print("\nSUMMARY:\n")
     print(report)
+    return status
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,16 +1,159 @@
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import argparse
+import sys
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from multiprocessing import resource_tracker, shared_memory
+import functools
 import importlib
+import itertools
 import math
+import mmap
 import time
 import multiprocessing as mp
-from typing import List, Dict
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Dict, NamedTuple, Optional, Tuple
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bench  # noqa: E402
 
 A = 0.0
 B = math.pi / 2.0
+# samples evaluated per numpy call by the vector backend; memory stays constant
+VECTOR_CHUNK = 1 << 16
+BACKENDS = ("python", "vector")
 
-def _partial_sum(func_module: str, func_name: str, a: float, step: float, start_idx: int, count: int) -> float:
+# Gauss-Kronrod 7/15 nodes and weights (QUADPACK qk15); the Gauss nodes are
+# the odd-indexed Kronrod ones plus the centre
+GK15_NODES = (0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+              0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+              0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+              0.207784955007898467600689403773245, 0.0)
+GK15_WEIGHTS = (0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+                0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+                0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+                0.204432940075298892414161999234649, 0.209482141084727828012999174891714)
+G7_WEIGHTS = (0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+              0.381830050505118944950369775488975, 0.417959183673469387755102040816327)
+# intervals narrower than this (relative to |x|) are accepted as they are
+MIN_WIDTH = 1e-12
+# evaluations one adaptive task spends before handing its leftovers back
+TASK_EVALS = 2000
+
+
+# samples below which an integral is not split across workers; small
+# integrals of a batch are packed together into tasks of about this size
+MIN_TASK_SAMPLES = 10_000
+TABULATED_RULES = ("rectangle", "trapezoid")
+# pseudo-module name for integrands that cannot be imported by name
+REGISTRY_MODULE = "<registry>"
+
+_registry: Dict[str, Callable] = {}
+_registry_ids: Dict[int, str] = {}
+_registry_version = 0
+_registry_counter = itertools.count()
+# whether this process runs a resource tracker of its own, decided on first attach
+_own_tracker: Optional[bool] = None
+
+
+class AdaptiveResult(NamedTuple):
+    value: float
+    error: float
+    evaluations: int
+
+
+def register_function(func: Callable, name: Optional[str] = None) -> str:
+    # lambdas and closures are referred to by an ID; process workers forked
+    # after the registration resolve the same ID to the same function. The
+    # entry stays until unregister_function(), and a process Integrator
+    # re-forks its pool once to pick it up.
+    global _registry_version
+    if name is None:
+        name = _registry_ids.get(id(func)) or f"{func.__module__}.{func.__qualname__}#{next(_registry_counter)}"
+    if _registry.get(name) is not func:
+        _registry[name] = func
+        _registry_ids[id(func)] = name
+        _registry_version += 1
+    return name
+
+
+def unregister_function(func_or_name) -> None:
+    # workers forked meanwhile keep their copy, which is harmless
+    name = func_or_name if isinstance(func_or_name, str) else _registry_ids.get(id(func_or_name))
+    func = _registry.pop(name, None)
+    if func is not None and _registry_ids.get(id(func)) == name:
+        del _registry_ids[id(func)]
+
+
+def _importable_ref(func: Callable) -> Optional[Tuple[str, str]]:
+    module, name = getattr(func, "__module__", None), getattr(func, "__name__", None)
+    try:
+        if getattr(importlib.import_module(module), name) is func:
+            return module, name
+    except (ImportError, AttributeError, TypeError, ValueError):
+        pass
+    return None
+
+
+@contextmanager
+def _func_ref(func: Callable, registered_only: bool = False) -> Iterator[Tuple[str, str]]:
+    # importable and registered functions are referred to as they are; any
+    # other callable gets a registry entry for the duration of the call, which
+    # reaches threads and workers forked inside it, but not an existing pool
+    ref = _importable_ref(func)
+    if ref is not None:
+        yield ref
+        return
+    name = _registry_ids.get(id(func))
+    if name is not None and _registry.get(name) is func:
+        yield REGISTRY_MODULE, name
+        return
+    if registered_only:
+        raise ValueError(f"{func!r} cannot be imported by name; call register_function() on it "
+                         "before using it with a process Integrator")
+    name = f"{getattr(func, '__qualname__', type(func).__name__)}#{next(_registry_counter)}"
+    _registry[name] = func
+    try:
+        yield REGISTRY_MODULE, name
+    finally:
+        del _registry[name]
+
+
+def _fork_context():
+    # forked workers inherit the registry; spawned ones only see importable functions
+    if "fork" in mp.get_all_start_methods():
+        return mp.get_context("fork")
+    return None
+
+def _resolve(func_module: str, func_name: str):
+    if func_module == REGISTRY_MODULE:
+        return _registry[func_name]
+    return _import_function(func_module, func_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _import_function(func_module: str, func_name: str):
+    # cached per process, so long-lived workers import the integrand once;
+    # registry entries are not cached here, so unregistering frees them
     mod = importlib.import_module(func_module)
-    f = getattr(mod, func_name)
+    return getattr(mod, func_name)
+
+
+def _as_vector_func(f):
+    # math.* functions have ufunc twins of the same name in numpy; anything
+    # else is expected to accept an array
+    if isinstance(f, np.ufunc):
+        return f
+    if getattr(f, "__module__", None) == "math":
+        twin = getattr(np, f.__name__, None)
+        if isinstance(twin, np.ufunc):
+            return twin
+    return f
+
+
+def _partial_sum(func_module: str, func_name: str, a: float, step: float, start_idx: int, count: int) -> float:
+    f = _resolve(func_module, func_name)
     acc = 0.0
     x = a + start_idx * step
     _f = f
@@ -21,31 +164,384 @@ def _partial_sum(func_module: str, func_name: str, a: float, step: float, start_
     return acc
 
 
-def integrate_parallel(func, a: float, b: float, n_jobs: int, n_iter: int, executor_type: str) -> float:
-    n_jobs = min(n_jobs, n_iter)
-    step = (b - a) / n_iter
+def _partial_sum_vector(func_module: str, func_name: str, a: float, step: float, start_idx: int, count: int) -> float:
+    if count <= 0:
+        return 0.0
+    f = _as_vector_func(_resolve(func_module, func_name))
+    n = min(count, VECTOR_CHUNK)
+    offsets = np.arange(n, dtype=np.float64)
+    x = np.empty(n)
+    partials = []
+    for i0 in range(0, count, n):
+        xs = x[:min(n, count - i0)]
+        np.add(offsets[:len(xs)], start_idx + i0, out=xs)
+        xs *= step
+        xs += a
+        if isinstance(f, np.ufunc):
+            y = f(xs, out=xs)
+        else:
+            y = np.asarray(f(xs), dtype=np.float64)
+        # np.sum is pairwise inside a chunk, fsum is exact across chunks
+        partials.append(float(np.sum(y)))
+    return math.fsum(partials) * step
+
+
+def _gauss_kronrod(f, a: float, b: float):
+    c = 0.5 * (a + b)
+    h = 0.5 * (b - a)
+    fc = f(c)
+    kronrod = fc * GK15_WEIGHTS[7]
+    gauss = fc * G7_WEIGHTS[3]
+    for j in range(7):
+        dx = h * GK15_NODES[j]
+        pair = f(c - dx) + f(c + dx)
+        kronrod += GK15_WEIGHTS[j] * pair
+        if j % 2 == 1:
+            gauss += G7_WEIGHTS[j // 2] * pair
+    return kronrod * h, abs((kronrod - gauss) * h), 15
+
+
+def _simpson(f, a: float, b: float):
+    m = 0.5 * (a + b)
+    fa, fm, fb = f(a), f(m), f(b)
+    flm, frm = f(0.5 * (a + m)), f(0.5 * (m + b))
+    whole = (b - a) / 6.0 * (fa + 4.0 * fm + fb)
+    halves = (m - a) / 6.0 * (fa + 4.0 * flm + fm) + (b - m) / 6.0 * (fm + 4.0 * frm + fb)
+    delta = halves - whole
+    # Richardson extrapolation; |delta| / 15 estimates the error of halves
+    return halves + delta / 15.0, abs(delta) / 15.0, 5
 
-    q, r = divmod(n_iter, n_jobs)
-    args = []
-    start = 0
-    for i in range(n_jobs):
-        cnt = q + (1 if i < r else 0)
-        args.append((func.__module__, func.__name__, a, step, start, cnt))
-        start += cnt
 
-    total = 0.0
+RULES = {"gk15": _gauss_kronrod, "simpson": _simpson}
+
+
+def _adaptive_task(func_module: str, func_name: str, rule: str, intervals, max_evals: int, final: bool):
+    # refine (a, b, tol) intervals depth-first until every one meets its
+    # tolerance or the budget runs out; leftovers go back to the shared queue
+    f = _resolve(func_module, func_name)
+    apply_rule = RULES[rule]
+    stack = list(intervals)
+    values, errors = [], []
+    evals = 0
+    while stack and (final or evals < max_evals):
+        a, b, tol = stack.pop()
+        value, error, n = apply_rule(f, a, b)
+        evals += n
+        if final or error <= tol or abs(b - a) <= MIN_WIDTH * max(abs(a), abs(b), 1.0):
+            values.append(value)
+            errors.append(error)
+        else:
+            m = 0.5 * (a + b)
+            stack.append((m, b, tol / 2.0))
+            stack.append((a, m, tol / 2.0))
+    return math.fsum(values), math.fsum(errors), evals, stack
+
+
+def integrate_adaptive(func, a: float, b: float, tol: float = 1e-9, n_jobs: int = 1,
+                       executor_type: str = "thread", rule: str = "gk15",
+                       max_evals: int = 10_000_000) -> AdaptiveResult:
+    # global tolerance is split in proportion to interval length; workers take
+    # intervals from one queue, and a task that has used up TASK_EVALS returns
+    # its unfinished intervals so idle workers can pick them up
+    if rule not in RULES:
+        raise ValueError(f"Unknown rule {rule!r}, expected one of {sorted(RULES)}")
+    pieces = max(n_jobs, 1) * 4
+    width = (b - a) / pieces
+    pending = deque((a + i * width, b if i == pieces - 1 else a + (i + 1) * width, tol / pieces)
+                    for i in range(pieces))
+    values, errors = [], []
+    evals = 0
     if executor_type == "thread":
-        with ThreadPoolExecutor(max_workers=n_jobs) as ex:
-            futures = [ex.submit(_partial_sum, *arg) for arg in args]
-            for fut in as_completed(futures):
-                total += fut.result()
+        pool = ThreadPoolExecutor(max_workers=max(n_jobs, 1))
     else:
-        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
-            futures = [ex.submit(_partial_sum, *arg) for arg in args]
-            for fut in as_completed(futures):
-                total += fut.result()
+        pool = ProcessPoolExecutor(max_workers=max(n_jobs, 1), mp_context=_fork_context())
+    with _func_ref(func) as (func_module, func_name), pool as ex:
+        running = set()
+        while pending or running:
+            while pending and len(running) < 2 * max(n_jobs, 1):
+                # past max_evals every remaining interval is accepted as estimated
+                final = evals >= max_evals
+                running.add(ex.submit(_adaptive_task, func_module, func_name, rule,
+                                      [pending.popleft()], TASK_EVALS, final))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                value, error, n, rest = fut.result()
+                values.append(value)
+                errors.append(error)
+                evals += n
+                pending.extend(rest)
+    return AdaptiveResult(math.fsum(values), math.fsum(errors), evals)
+
+
+def integrate_parallel(func, a: float, b: float, n_jobs: int, n_iter: int, executor_type: str,
+                       backend: str = "python") -> float:
+    # executor_type: "thread", "process", or "vector" (vector backend, no pool);
+    # backend "vector" evaluates numpy chunks inside the pool workers, where
+    # threads scale too because numpy drops the GIL
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    step = (b - a) / n_iter
+    with _func_ref(func) as (func_module, func_name):
+        if executor_type == "vector":
+            return _partial_sum_vector(func_module, func_name, a, step, 0, n_iter)
+        partial_sum = _partial_sum_vector if backend == "vector" else _partial_sum
+        n_jobs = min(n_jobs, n_iter)
+
+        q, r = divmod(n_iter, n_jobs)
+        args = []
+        start = 0
+        for i in range(n_jobs):
+            cnt = q + (1 if i < r else 0)
+            args.append((func_module, func_name, a, step, start, cnt))
+            start += cnt
+
+        total = 0.0
+        if executor_type == "thread":
+            with ThreadPoolExecutor(max_workers=n_jobs) as ex:
+                futures = [ex.submit(partial_sum, *arg) for arg in args]
+                for fut in as_completed(futures):
+                    total += fut.result()
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=_fork_context()) as ex:
+                futures = [ex.submit(partial_sum, *arg) for arg in args]
+                for fut in as_completed(futures):
+                    total += fut.result()
+        return total
+
+def _run_pieces(pieces) -> List[float]:
+    # one pool task: partial sums of several (backend, module, name, a, step, start, count) pieces
+    out = []
+    for backend, *args in pieces:
+        out.append(_partial_sum_vector(*args) if backend == "vector" else _partial_sum(*args))
+    return out
+
+
+class Integrator:
+    # Long-lived integrator: the pool is created once and kept warm, workers
+    # keep their resolved integrands, and a batch of integrals goes out as
+    # a few packed tasks instead of one executor per call. A process pool only
+    # takes importable integrands or ones passed to register_function().
+    def __init__(self, n_jobs: Optional[int] = None, executor_type: str = "thread", backend: str = "python"):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.n_jobs = n_jobs or mp.cpu_count()
+        self.executor_type = executor_type
+        self.backend = backend
+        self._pool = None
+        self._pool_version = None
+
+    def _executor(self):
+        if self._pool is not None:
+            if self.executor_type == "thread" or self._pool_version == _registry_version:
+                return self._pool
+            # functions registered since the fork are unknown to the workers
+            self._pool.shutdown()
+        if self.executor_type == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=self.n_jobs)
+        else:
+            self._pool = ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=_fork_context())
+        self._pool_version = _registry_version
+        return self._pool
+
+    def _pieces(self, func_module: str, func_name: str, a: float, b: float, n_iter: int):
+        step = (b - a) / n_iter
+        parts = min(self.n_jobs, max(1, n_iter // MIN_TASK_SAMPLES))
+        q, r = divmod(n_iter, parts)
+        start = 0
+        for i in range(parts):
+            cnt = q + (1 if i < r else 0)
+            yield (self.backend, func_module, func_name, a, step, start, cnt)
+            start += cnt
+
+    def integrate_many(self, integrals: Iterable[Tuple[Callable, float, float, int]]) -> List[float]:
+        with ExitStack() as refs:
+            return self._integrate_many(list(integrals), refs)
+
+    def _integrate_many(self, integrals, refs: ExitStack) -> List[float]:
+        # threads share the registry, so closures only need an entry while the
+        # batch runs; forked workers only know what was registered before the fork
+        registered_only = self.executor_type != "thread"
+        pieces, owners = [], []
+        for idx, (func, a, b, n_iter) in enumerate(integrals):
+            func_module, func_name = refs.enter_context(_func_ref(func, registered_only))
+            for piece in self._pieces(func_module, func_name, a, b, n_iter):
+                pieces.append(piece)
+                owners.append(idx)
+        tasks, current, samples = [], [], 0
+        for piece in pieces:
+            current.append(piece)
+            samples += piece[-1]
+            if samples >= MIN_TASK_SAMPLES:
+                tasks.append(current)
+                current, samples = [], 0
+        if current:
+            tasks.append(current)
+        ex = self._executor()
+        futures = [ex.submit(_run_pieces, task) for task in tasks]
+        partials: List[List[float]] = [[] for _ in integrals]
+        owner = iter(owners)
+        for fut in futures:
+            for value in fut.result():
+                partials[next(owner)].append(value)
+        return [math.fsum(p) for p in partials]
+
+    def integrate(self, func, a: float, b: float, n_iter: int) -> float:
+        return self.integrate_many([(func, a, b, n_iter)])[0]
+
+    def integrate_tabulated(self, samples, weights=None, dx: float = 1.0, rule: str = "trapezoid") -> float:
+        return integrate_tabulated(samples, weights, dx, rule, self.n_jobs, self._executor())
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "Integrator":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# kind ("shm" or "file"), shared memory name or file path, shape, dtype, file offset
+SharedSpec = Tuple[str, str, Tuple[int, ...], str, int]
+
+
+class SharedArray:
+    # An array workers can attach to by name: file-backed memmaps are shared
+    # as they are, anything else is copied once into shared memory.
+    def __init__(self, spec: SharedSpec, array: np.ndarray, shm: Optional[shared_memory.SharedMemory] = None):
+        self.spec = spec
+        self.array = array
+        self._shm = shm
+
+    @classmethod
+    def share(cls, data) -> "SharedArray":
+        if isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap) and data.flags.c_contiguous:
+            spec = ("file", data.filename, data.shape, data.dtype.str, data.offset)
+            return cls(spec, data)
+        data = np.asarray(data)
+        shared = cls.create(data.shape, data.dtype)
+        shared.array[...] = data
+        return shared
+
+    @classmethod
+    def create(cls, shape, dtype) -> "SharedArray":
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        return cls(("shm", shm.name, tuple(shape), dtype.str, 0), array, shm)
+
+    def close(self) -> None:
+        self.array = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self) -> "SharedArray":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _attach(spec: SharedSpec):
+    kind, name, shape, dtype, offset = spec
+    if kind == "file":
+        return None, np.memmap(name, dtype=dtype, mode="r", offset=offset, shape=shape)
+    shm = _attach_shm(name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    # attaching registers the segment with the resource tracker. A worker
+    # forked before the creator started its tracker gets one of its own, which
+    # would report the segment as leaked and unlink it again when it exits.
+    global _own_tracker
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # track= is Python 3.13+
+        pass
+    if _own_tracker is None:
+        _own_tracker = resource_tracker._resource_tracker._fd is None
+    shm = shared_memory.SharedMemory(name=name)
+    if _own_tracker:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _tabulated_task(samples_spec: SharedSpec, weights_spec: Optional[SharedSpec], result_spec: SharedSpec,
+                    index: int, start: int, end: int) -> None:
+    # attached per task and released right after: nothing outlives the call
+    # that owns the segments, and only names and bounds are pickled
+    handles = []
+    try:
+        shm, samples = _attach(samples_spec)
+        handles.append(shm)
+        if weights_spec is None:
+            part = float(np.sum(samples[start:end], dtype=np.float64))
+            weights = None
+        else:
+            shm, weights = _attach(weights_spec)
+            handles.append(shm)
+            part = float(np.dot(samples[start:end].astype(np.float64, copy=False),
+                                weights[start:end].astype(np.float64, copy=False)))
+        shm, results = _attach(result_spec)
+        handles.append(shm)
+        results[index] = part
+        del samples, weights, results
+    finally:
+        for shm in handles:
+            if shm is not None:
+                shm.close()
+
+
+def integrate_tabulated(samples, weights=None, dx: float = 1.0, rule: str = "trapezoid",
+                        n_jobs: Optional[int] = None, executor=None) -> float:
+    # Integral of pretabulated samples: sum(weights * samples) when weights
+    # are given, else the rectangle/trapezoid rule with spacing dx. Samples,
+    # weights and the per-chunk results live in shared memory (or the
+    # caller's memmap file); futures only signal completion.
+    if rule not in TABULATED_RULES:
+        raise ValueError(f"Unknown rule {rule!r}, expected one of {TABULATED_RULES}")
+    n = len(samples)
+    if weights is not None and len(weights) != n:
+        raise ValueError(f"samples and weights differ in length: {n} and {len(weights)}")
+    if n == 0:
+        return 0.0
+    n_jobs = n_jobs or mp.cpu_count()
+    pieces = min(n, n_jobs * 4)
+    bounds = [n * i // pieces for i in range(pieces + 1)]
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, mp_context=_fork_context())
+    shared = []
+    try:
+        y = SharedArray.share(samples)
+        shared.append(y)
+        w = None
+        if weights is not None:
+            w = SharedArray.share(weights)
+            shared.append(w)
+        results = SharedArray.create((pieces,), np.float64)
+        shared.append(results)
+        futures = [executor.submit(_tabulated_task, y.spec, None if w is None else w.spec, results.spec,
+                                   i, bounds[i], bounds[i + 1]) for i in range(pieces)]
+        for fut in futures:
+            fut.result()
+        total = math.fsum(results.array.tolist())
+        if weights is not None:
+            return total
+        if rule == "trapezoid":
+            total -= 0.5 * (float(y.array[0]) + float(y.array[n - 1]))
+        return total * dx
+    finally:
+        for arr in shared:
+            arr.close()
+        if own_executor:
+            executor.shutdown()
 
-    return total
 
 def run_threads(n_iter: int, n_jobs: int) -> float:
     t0 = time.perf_counter()
@@ -61,66 +557,51 @@ def run_processes(n_iter: int, n_jobs: int) -> float:
     return t1 - t0
 
 
-def summarize(times: List[float]) -> str:
-    avg = sum(times) / len(times)
-    mn = min(times)
-    mx = max(times)
-    return f"runs: {len(times)}, avg: {avg:.4f}s, min: {mn:.4f}s, max: {mx:.4f}s\n" \
-           + "\n".join(f"{i+1:2d}: {t:.4f}s" for i, t in enumerate(times))
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="integrate.py", description="Benchmark integrate_parallel on threads and processes.")
+    parser.add_argument("--n-iter", type=int, default=10000000, help="samples per integral (default 10000000)")
+    parser.add_argument("--max-jobs", type=int, default=None, help="largest n_jobs tried (default 2 x CPUs)")
+    bench.add_arguments(parser, out="task_2/artifacts.txt", repeats=3)
+    return parser.parse_args(argv)
 
-def main():
+def main(argv=None) -> int:
+    args = parse_args(argv)
     cpu_cnt = mp.cpu_count()
-    max_jobs = cpu_cnt * 2
-    
-    repeats = 3
-    n_iter = 10000000
+    max_jobs = args.max_jobs or cpu_cnt * 2
+    n_iter = args.n_iter
+    repeats = args.repeats or "calibrated"
 
     print(f"Platform: CPUs={cpu_cnt}")
-    print(f"Parameters: n_iter={n_iter}, repeats={repeats}, jobs range=1..{max_jobs}\n")
-
-    thread_times: Dict[int, List[float]] = {j: [] for j in range(1, max_jobs + 1)}
-    process_times: Dict[int, List[float]] = {j: [] for j in range(1, max_jobs + 1)}
-
+    print(f"Parameters: n_iter={n_iter}, repeats={repeats}, warmup={args.warmup}, jobs range=1..{max_jobs}\n")
 
-    for rep in range(1, repeats + 1):
-        print(f"--- Repeat {rep}/{repeats} ---\n")
-
-        for n_jobs in range(1, max_jobs + 1):
-            print(f"--- n_jobs = {n_jobs} ---")
-
-            print("Running threads...")
-            t_threads = run_threads(n_iter, n_jobs)
-            print(f"threads total: {t_threads:.4f}s")
-            thread_times[n_jobs].append(t_threads)
-
-            print("Running processes...")
-            t_procs = run_processes(n_iter, n_jobs)
-            print(f"processes total: {t_procs:.4f}s\n")
-            process_times[n_jobs].append(t_procs)
+    options = bench.bench_options(args)
+    thread_results = []
+    process_results = []
+    for n_jobs in range(1, max_jobs + 1):
+        print(f"--- n_jobs = {n_jobs} ---")
+        params = {"n_iter": n_iter, "n_jobs": n_jobs}
+        thread_results.append(bench.run_benchmark("threads", run_threads, n_iter, n_jobs, params=params, **options))
+        process_results.append(bench.run_benchmark("processes", run_processes, n_iter, n_jobs, params=params, **options))
 
     report_lines: List[str] = []
     report_lines.append(f"Benchmark integrate(math.cos, {A}, {B})\n")
     report_lines.append(f"Parameters: n_iter={n_iter}, repeats={repeats}, jobs_range=1..{max_jobs}\n")
-    
+
     report_lines.append("\nTHREADS (per n_jobs):\n")
-    for n_jobs in range(1, max_jobs + 1):
+    for n_jobs, result in enumerate(thread_results, 1):
         report_lines.append(f"\nn_jobs = {n_jobs}:\n")
-        report_lines.append(summarize(thread_times[n_jobs]))
+        report_lines.append(bench.format_result(result))
 
     report_lines.append("\nPROCESSES (per n_jobs):\n")
-    for n_jobs in range(1, max_jobs + 1):
+    for n_jobs, result in enumerate(process_results, 1):
         report_lines.append(f"\nn_jobs = {n_jobs}:\n")
-        report_lines.append(summarize(process_times[n_jobs]))
+        report_lines.append(bench.format_result(result))
 
     report = "\n".join(report_lines)
-
-    out_path = "task_2/artifacts.txt"
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write(report)
-
-    print("\nReport written to:", out_path)
+    status = bench.write_reports(args, f"integrate(math.cos, {A}, {B})", report, thread_results + process_results)
     print("\nSUMMARY:\n")
     print(report)
+    return status
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
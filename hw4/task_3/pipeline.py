@@ -1,135 +1,152 @@
-import multiprocessing as mp
+import argparse
+import codecs
+import sys
 import threading
 import time
-from collections import deque
-from queue import Empty
-import codecs
+from functools import partial
+
+from stages import DEFAULT_QUEUE_SIZE, Pipeline, PipelineError, Stage
 
 SEND_INTERVAL = 5.0
+# default limit: one message per SEND_INTERVAL, no burst
+DEFAULT_RATE = 1.0 / SEND_INTERVAL
+DEFAULT_BURST = 1
+# messages per queue operation
+MAX_BATCH = 1024
+READ_CHUNK = 64 * 1024
 
 def timestamp_now():
     return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
-def process_a(parent_to_a: mp.Queue, a_to_b: mp.Queue):
-    local_q = deque()
-    finishing = False
-
-    last_sent = time.time()
-
+def to_lower(item: str) -> str:
+    return item.lower()
+
+def rot13_batch(items, quiet: bool = False):
+    encoded = [codecs.encode(item, "rot_13") for item in items]
+    ts = timestamp_now()
+    if not quiet:
+        sys.stdout.write("".join(f"[{ts}] {e}\n" for e in encoded))
+        sys.stdout.flush()
+    return [(ts, e) for e in encoded]
+
+def build_pipeline(rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, workers: int = 1,
+                   batch: int = MAX_BATCH, queue_size: int = DEFAULT_QUEUE_SIZE, quiet: bool = False) -> Pipeline:
+    # the original A -> B flow: rate-limited lower-casing, then rot13
+    return Pipeline([
+        Stage("lower", to_lower, rate=rate, burst=burst, queue_size=queue_size),
+        Stage("rot13", partial(rot13_batch, quiet=quiet), workers=workers, per_batch=True,
+              queue_size=queue_size),
+    ], batch=batch)
+
+def format_metrics(metrics) -> str:
+    lines = []
+    for name, m in metrics.items():
+        depth = "n/a" if m["queue_depth"] is None else m["queue_depth"]
+        lines.append(f"{name}: workers={m['workers']} items={m['items']} errors={m['errors']} "
+                     f"throughput={m['throughput']:,.0f}/s avg latency={m['avg_latency'] * 1000:.2f}ms "
+                     f"max latency={m['max_latency'] * 1000:.2f}ms busy={m['busy']:.3f}s queue depth={depth}")
+    return "\n".join(lines)
+
+def read_batches(stream, batch: int):
+    # piped input: whatever the pipe already holds goes out as one batch,
+    # a lone line is still sent right away
+    pending = b""
     while True:
-        try:
-            item = parent_to_a.get(timeout=0.5)
-        except Empty:
-            item = None
-        else:
-            if item is None:
-                finishing = True
-            else:
-                local_q.append(item)
-
-        now = time.time()
-        if (now - last_sent) >= SEND_INTERVAL and local_q:
-            msg = local_q.popleft()
-            try:
-                a_to_b.put(msg.lower())
-            except Exception:
-                pass
-            last_sent = now
-
-        if finishing and not local_q:
-            try:
-                a_to_b.put(None)
-            except Exception:
-                pass
+        chunk = stream.read1(READ_CHUNK)
+        if not chunk:
             break
-    return
-
-
-def process_b(a_to_b: mp.Queue, b_to_parent: mp.Queue):
-    while True:
-        item = a_to_b.get()
-        if item is None:
-            try:
-                b_to_parent.put(None)
-            except Exception:
-                pass
-            break
-        
-        encoded = codecs.encode(item, "rot_13")
-        ts = timestamp_now()
-        print(f"[{ts}] {encoded}", flush=True)
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for i in range(0, len(lines), batch):
+            yield [line.decode("utf-8", "replace") for line in lines[i:i + batch]]
+    if pending:
+        yield [pending.decode("utf-8", "replace")]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="pipeline.py",
+                                     description="Lower-case in stage lower, rot13 in stage rot13.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"messages per second forwarded by lower, 0 for no limit (default {DEFAULT_RATE:g})")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST,
+                        help=f"messages lower may forward at once after being idle (default {DEFAULT_BURST})")
+    parser.add_argument("--batch", type=int, default=MAX_BATCH,
+                        help=f"largest number of messages per queue operation (default {MAX_BATCH})")
+    parser.add_argument("--workers", type=int, default=1, help="rot13 worker processes (default 1)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"batches a stage queue holds before senders block (default {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument("--quiet", action="store_true", help="do not print every message")
+    parser.add_argument("--metrics", action="store_true", help="print per-stage metrics on shutdown")
+    parser.add_argument("--bench", type=int, metavar="N",
+                        help="push N generated messages through instead of reading stdin and report msg/s")
+    args = parser.parse_args(argv)
+    if args.batch < 1:
+        parser.error("--batch must be positive")
+    if args.workers < 1:
+        parser.error("--workers must be positive")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be positive")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    quiet = args.quiet or args.bench is not None
+    pipeline = build_pipeline(args.rate, args.burst, args.workers, args.batch, args.queue_size, quiet)
+    pipeline.start()
+
+    received = [0]
+    failure = []
+
+    def reader():
         try:
-            b_to_parent.put((ts, encoded))
-        except Exception:
-            pass
-    return
-
-def main():
-    parent_to_a = mp.Queue()
-    a_to_b = mp.Queue()
-    b_to_parent = mp.Queue()
-
-    proc_a = mp.Process(target=process_a, args=(parent_to_a, a_to_b), daemon=False)
-    proc_b = mp.Process(target=process_b, args=(a_to_b, b_to_parent), daemon=False)
-    proc_a.start()
-    proc_b.start()
-    
-    shutdown_event = threading.Event()
-
-    def b_reader():
-        while True:
-            try:
-                item = b_to_parent.get(timeout=0.5)
-            except Empty:
-                if shutdown_event.is_set() and not proc_b.is_alive():
-                    break
-                continue
-
-            if item is None:
-                break
-            ts, encoded = item
-            line = f"[{ts}] FROM_B: {encoded}"
-            print(f"(logged) {line}", flush=True)
-
-    t_b_reader = threading.Thread(target=b_reader, daemon=True)
-    t_b_reader.start()
-
-    print("Enter lines. Type Ctrl-C or Ctrl-D to abort.")
+            for items in pipeline.batches():
+                received[0] += len(items)
+                if not quiet:
+                    sys.stdout.write("".join(f"(logged) [{ts}] FROM_B: {e}\n" for ts, e in items))
+                    sys.stdout.flush()
+        except PipelineError as exc:
+            failure.append(exc)
 
-    try:
-        while True:
-            try:
-                line = input()
-            except EOFError:
-                print("EOF received, sending termination sentinel to A...", flush=True)
-                parent_to_a.put(None)
-                shutdown_event.set()
-                break
-            text = line.rstrip("\n")
-            parent_to_a.put(text)
-    except KeyboardInterrupt:
-        print("\nKeyboardInterrupt received, sending termination sentinel to A...")
-        try:
-            parent_to_a.put(None)
-        except Exception:
-            pass
-        shutdown_event.set()
+    t_reader = threading.Thread(target=reader, daemon=True)
+    t_reader.start()
 
-    start_wait = time.time()
-    print("Waiting for processes A and B to finish...")
-    try:
-        proc_a.join(timeout=SEND_INTERVAL)
-    except Exception:
-        pass
     try:
-        proc_b.join(timeout=SEND_INTERVAL)
-    except Exception:
+        if args.bench is not None:
+            t0 = time.perf_counter()
+            pipeline.submit_all(f"Message-{j}" for j in range(args.bench))
+            pipeline.close()
+            t_reader.join()
+            elapsed = time.perf_counter() - t0
+            print(f"{received[0]} messages in {elapsed:.3f}s: {received[0] / elapsed:,.0f} msg/s", flush=True)
+        else:
+            print("Enter lines. Type Ctrl-C or Ctrl-D to abort.")
+            if sys.stdin.isatty():
+                while True:
+                    try:
+                        line = input()
+                    except EOFError:
+                        break
+                    pipeline.submit([line.rstrip("\n")])
+            else:
+                for lines in read_batches(sys.stdin.buffer, args.batch):
+                    pipeline.submit(lines)
+            print("EOF received, sending termination sentinel...", flush=True)
+            pipeline.close()
+    except KeyboardInterrupt:
+        print("\nKeyboardInterrupt received, stopping the pipeline...")
+        pipeline.terminate()
+    except PipelineError:
+        # a stage failed and the reader already stopped the pipeline
         pass
 
-    shutdown_event.set()
-    t_b_reader.join(timeout=SEND_INTERVAL)
-
+    print(f"Waiting for stages {', '.join(s.name for s in pipeline.stages)} to finish...")
+    t_reader.join(timeout=SEND_INTERVAL)
+    pipeline.join(timeout=SEND_INTERVAL)
+    if args.metrics:
+        print(format_metrics(pipeline.metrics()))
+    if failure:
+        print(f"Pipeline failed: {failure[0]}", file=sys.stderr)
     print("Shutdown complete.", flush=True)
+    return 1 if failure else 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
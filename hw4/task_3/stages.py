@@ -0,0 +1,312 @@
+import multiprocessing as mp
+import time
+import traceback
+from queue import Empty, Full
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_BATCH = 1024
+DEFAULT_QUEUE_SIZE = 64
+POLL_TIMEOUT = 0.5
+STOP = None
+# per-stage shared counters
+ITEMS, BATCHES, LATENCY_SUM, LATENCY_MAX, BUSY, ERRORS = range(6)
+
+
+class PipelineError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    # rate tokens per second, at most burst of them banked; rate <= 0 means no limit
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def take(self, wanted: int) -> int:
+        if self.unlimited:
+            return wanted
+        self._refill()
+        granted = min(wanted, int(self.tokens))
+        self.tokens -= granted
+        return granted
+
+    def delay(self) -> float:
+        # seconds until the next token
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Stage:
+    # func maps one item to one item, or a whole list when per_batch is set.
+    # ordered: the stage sees its input in submission order (one worker only).
+    # rate/burst: token-bucket limit on items leaving the stage, split evenly
+    # between its workers.
+    def __init__(self, name: str, func: Callable, workers: int = 1, per_batch: bool = False,
+                 ordered: bool = False, rate: float = 0.0, burst: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        if workers < 1:
+            raise ValueError(f"stage {name!r}: workers must be positive")
+        if ordered and workers != 1:
+            raise ValueError(f"stage {name!r}: ordered input needs exactly one worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.per_batch = per_batch
+        self.ordered = ordered
+        self.rate = rate
+        self.burst = burst
+        self.queue_size = queue_size
+
+
+# A message is (seq, sub, last, t_in, error, items): batch seq, split into
+# parts sub = 0, 1, ... by a rate-limited stage, last marking the final part.
+class _Reorderer:
+    def __init__(self):
+        self.pending = {}
+        self.seq = 0
+        self.sub = 0
+
+    def push(self, msg) -> Iterator[tuple]:
+        self.pending[(msg[0], msg[1])] = msg
+        while (self.seq, self.sub) in self.pending:
+            msg = self.pending.pop((self.seq, self.sub))
+            if msg[2]:
+                self.seq += 1
+                self.sub = 0
+            else:
+                self.sub += 1
+            yield msg
+
+
+def _record(stats, items: int, latency: float, error: bool) -> None:
+    with stats.get_lock():
+        stats[ITEMS] += items
+        stats[BATCHES] += 1
+        stats[LATENCY_SUM] += latency
+        stats[LATENCY_MAX] = max(stats[LATENCY_MAX], latency)
+        stats[ERRORS] += error
+
+
+def _stage_worker(stage: Stage, in_q, out_q, upstream: int, stops_seen, stats) -> None:
+    bucket = None
+    if stage.rate > 0:
+        bucket = TokenBucket(stage.rate / stage.workers, max(stage.burst // stage.workers, 1))
+    reorder = _Reorderer() if stage.ordered else None
+
+    def emit(seq, sub, last, t_in, error, items):
+        now = time.time()
+        out_q.put((seq, sub, last, now, error, items))
+        # latency: waiting in the input queue plus processing
+        _record(stats, len(items) if items else 0, now - t_in, error is not None)
+
+    def handle(msg):
+        seq, sub, last, t_in, error, items = msg
+        if error is not None:
+            emit(seq, sub, last, t_in, error, None)
+            return
+        t0 = time.perf_counter()
+        try:
+            out = stage.func(items) if stage.per_batch else [stage.func(item) for item in items]
+        except Exception:
+            error = f"stage {stage.name!r} failed:\n{traceback.format_exc()}"
+            out = None
+        with stats.get_lock():
+            stats[BUSY] += time.perf_counter() - t0
+        if bucket is None or error is not None:
+            emit(seq, sub, last, t_in, error, out)
+            return
+        # released in parts as tokens come in; parts keep their place by sub
+        part = 0
+        while True:
+            n = bucket.take(len(out))
+            if n == 0 and out:
+                time.sleep(bucket.delay())
+                continue
+            head, out = out[:n], out[n:]
+            emit(seq, part, last and not out, t_in, None, head)
+            part += 1
+            if not out:
+                return
+
+    try:
+        while True:
+            msg = in_q.get()
+            if msg is STOP:
+                # one stop arrives per upstream worker, after all its data; the
+                # reader of the last one wakes its siblings with extra stops
+                with stops_seen.get_lock():
+                    stops_seen.value += 1
+                    seen = stops_seen.value
+                if seen < upstream:
+                    continue
+                if seen == upstream:
+                    for _ in range(stage.workers - 1):
+                        in_q.put(STOP)
+                break
+            if reorder is None:
+                handle(msg)
+            else:
+                for ready in reorder.push(msg):
+                    handle(ready)
+    finally:
+        out_q.put(STOP)
+
+
+class Pipeline:
+    # Stages connected by bounded queues, each stage run by its own worker
+    # processes. Items go in as batches numbered in submission order; results
+    # come out in that order (ordered=True) or as they finish. An exception in
+    # a stage travels downstream as an error record and is raised by results().
+    def __init__(self, stages: List[Stage], ordered: bool = True, batch: int = DEFAULT_BATCH):
+        if not stages:
+            raise ValueError("a pipeline needs at least one stage")
+        if sum(1 for s in stages if s.rate > 0) > 1:
+            raise ValueError("only one stage may be rate limited")
+        self.stages = stages
+        self.ordered = ordered
+        self.batch = batch
+        self.queues = [mp.Queue(maxsize=s.queue_size) for s in stages]
+        self.output = mp.Queue(maxsize=stages[-1].queue_size)
+        self.stats = [mp.Array('d', 6) for _ in stages]
+        # kept here: a freed Value's shared block would be handed to the next one
+        self.stops_seen = [mp.Value('i', 0) for _ in stages]
+        self.processes: List[List[mp.Process]] = []
+        self._seq = 0
+        self._started = None
+        self._stopped = False
+
+    def start(self) -> "Pipeline":
+        upstream = 1
+        for i, stage in enumerate(self.stages):
+            out_q = self.queues[i + 1] if i + 1 < len(self.stages) else self.output
+            procs = [mp.Process(target=_stage_worker, name=f"{stage.name}-{w}",
+                                args=(stage, self.queues[i], out_q, upstream, self.stops_seen[i], self.stats[i]))
+                     for w in range(stage.workers)]
+            for p in procs:
+                p.start()
+            self.processes.append(procs)
+            upstream = stage.workers
+        self._started = time.time()
+        return self
+
+    def _put(self, msg) -> None:
+        # bounded queues push back on the producer; give up once stopped
+        while True:
+            if self._stopped:
+                raise PipelineError("pipeline was stopped")
+            try:
+                self.queues[0].put(msg, timeout=POLL_TIMEOUT)
+                return
+            except Full:
+                continue
+
+    def submit(self, items: List[Any]) -> None:
+        self._put((self._seq, 0, True, time.time(), None, list(items)))
+        self._seq += 1
+
+    def submit_all(self, items: Iterable[Any]) -> None:
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.batch:
+                self.submit(chunk)
+                chunk = []
+        if chunk:
+            self.submit(chunk)
+
+    def close(self) -> None:
+        # poison pill: each stage passes it on once all its workers are done
+        self._put(STOP)
+
+    def _dead_worker(self) -> Optional[str]:
+        for stage, procs in zip(self.stages, self.processes):
+            for p in procs:
+                if p.exitcode not in (None, 0):
+                    return f"worker {p.name} of stage {stage.name!r} died with exit code {p.exitcode}"
+        return None
+
+    def batches(self) -> Iterator[List[Any]]:
+        reorder = _Reorderer() if self.ordered else None
+        stops = 0
+        last_workers = self.stages[-1].workers
+        while stops < last_workers:
+            try:
+                msg = self.output.get(timeout=POLL_TIMEOUT)
+            except Empty:
+                dead = self._dead_worker()
+                if dead is not None:
+                    self.terminate()
+                    raise PipelineError(dead)
+                continue
+            if msg is STOP:
+                stops += 1
+                continue
+            for ready in (reorder.push(msg) if reorder is not None else (msg,)):
+                if ready[4] is not None:
+                    self.terminate()
+                    raise PipelineError(ready[4])
+                yield ready[5]
+
+    def results(self) -> Iterator[Any]:
+        for items in self.batches():
+            yield from items
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for procs in self.processes:
+            for p in procs:
+                p.join(timeout)
+
+    def terminate(self) -> None:
+        self._stopped = True
+        for procs in self.processes:
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+        self.join()
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        elapsed = max(time.time() - (self._started or time.time()), 1e-9)
+        out = {}
+        for stage, q, stats in zip(self.stages, self.queues, self.stats):
+            with stats.get_lock():
+                items, batches, lat_sum, lat_max, busy, errors = stats[:]
+            try:
+                depth = q.qsize()
+            except NotImplementedError:  # macOS has no sem_getvalue
+                depth = None
+            out[stage.name] = {
+                "workers": stage.workers,
+                "queue_depth": depth,
+                "items": int(items),
+                "batches": int(batches),
+                "errors": int(errors),
+                "throughput": items / elapsed,
+                "avg_latency": lat_sum / batches if batches else 0.0,
+                "max_latency": lat_max,
+                "busy": busy,
+            }
+        return out
+
+    def __enter__(self) -> "Pipeline":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.terminate()
+        else:
+            self.join()